@@ -0,0 +1,243 @@
+'''
+annotateORFs.py -- find the longest open reading frame in each frame of each
+noncoding exon in a table, storing the results as columns.
+
+Exons with (start phase, end phase) = (-1, -1) carry no reading frame
+information, so *translateExon* falls back to searching them for their longest
+ORF. This program does that search once for a whole table, so that start exon
+detection and translation can read the precomputed columns rather than
+rescanning every sequence.
+
+All sequences in the table are concatenated into a single buffer, and the
+positions of start and stop codons are found for the whole buffer at once. Each
+codon is keyed by its sequence and frame, and every start codon is matched to
+the next stop codon with the same key in one sorted search over the buffer, so
+there is no loop over the exons. Peptides are only translated for the ORFs
+that were found.
+
+The following columns are added, for each frame f in 0, 1, 2:
+	orf_start_f, orf_stop_f, orf_length_f, orf_peptide_f
+and for the longest ORF over all frames:
+	orf_start, orf_stop, orf_length, orf_frame, orf_peptide
+Exons without an ORF, or that are not (-1, -1) if *only_noncoding*, have start
+and stop -1, length 0 and an empty peptide. The orf_peptide_f columns are left
+out if *frame_peptides* is not set, as when translating with *translateExon*,
+which only reads orf_peptide.
+'''
+import os
+import numpy as np
+import pandas as pd
+from codonTable import codonTable
+from translateExon import translate
+import transcriptStore
+
+# Encodes each nucleotide as 0-3, anything else as 4. Codons are encoded as
+# 25*n0 + 5*n1 + n2.
+baseCodes = np.zeros(256, dtype=np.uint8) + 4
+for b, c in zip('ACGTU', [0, 1, 2, 3, 3]):
+	baseCodes[ord(b)] = c
+
+def _codonCode(codon):
+	return 25*baseCodes[ord(codon[0])] + 5*baseCodes[ord(codon[1])] + baseCodes[ord(codon[2])]
+
+isStartCodon = np.zeros(125, dtype=bool)
+isStopCodon = np.zeros(125, dtype=bool)
+for codon in codonTable:
+	if 'N' in codon:
+		continue
+	if codonTable[codon]=='M':
+		isStartCodon[_codonCode(codon)] = True
+	elif codonTable[codon]=='X':
+		isStopCodon[_codonCode(codon)] = True
+
+def codonMasks(sequence):
+	'''
+	Find the positions of the start and stop codons in a nucleotide sequence.
+
+	INPUT
+		sequence : string, nucleotide sequence
+
+	RETURNS
+		(starts, stops) : numpy arrays of bool, *True* at each position where a
+			start or stop codon begins
+
+	'''
+	seq = baseCodes[np.frombuffer(sequence + 'NN', dtype=np.uint8)].astype(np.uint16)
+	codons = 25*seq[:-2] + 5*seq[1:-1] + seq[2:]
+	return isStartCodon[codons], isStopCodon[codons]
+
+def _codonPositions(mask, offsets):
+	'''
+	The sequence, position within the sequence and frame of each codon in
+	*mask*, a codon mask of a buffer of sequences starting at *offsets*.
+	'''
+	pos = np.flatnonzero(mask)
+	seq_id = np.searchsorted(offsets, pos, side='right') - 1
+	local = pos - offsets[seq_id]
+	return seq_id, local, local % 3
+
+def longestORFs(starts, stops, offsets, lengths):
+	'''
+	Find the longest ORF in each frame of each of a set of sequences, given the
+	codon masks of the buffer they are concatenated in. Matches the conventions
+	of *translateExon.findORF*: the ORF stops at the first in-frame stop codon
+	and excludes it, the last complete codon of the sequence is not considered
+	as a stop, and ties are broken in favor of the ORF that starts furthest
+	downstream.
+
+	INPUT
+		starts, stops : numpy arrays of bool, as returned by *codonMasks* for the buffer
+		offsets : numpy array of int, position of each sequence in the buffer.
+			Sequences must be separated by at least one character that is not a
+			nucleotide.
+		lengths : numpy array of int, length of each sequence
+
+	RETURNS
+		numpy array of shape (len(offsets), 3, 3), the (start, stop, length) of
+			the longest ORF in each frame of each sequence. (-1, -1, 0) if there is
+			no ORF in that frame.
+
+	'''
+	orf_table = np.zeros((len(offsets), 3, 3), dtype=np.int64)
+	orf_table[:,:,:2] = -1
+	if len(offsets)==0:
+		return orf_table
+	span = int(lengths.max()) + 1
+
+	start_id, start_pos, start_frame = _codonPositions(starts, offsets)
+	valid = start_pos < lengths[start_id] - 3
+	start_keys = (start_id[valid]*3 + start_frame[valid])*span + start_pos[valid]
+
+	stop_id, stop_pos, stop_frame = _codonPositions(stops, offsets)
+	last_codon_end = lengths[stop_id] - (lengths[stop_id] - stop_frame) % 3
+	valid = stop_pos < last_codon_end - 5
+	stop_keys = np.sort((stop_id[valid]*3 + stop_frame[valid])*span + stop_pos[valid])
+	if len(start_keys)==0 or len(stop_keys)==0:
+		return orf_table
+
+	#the next stop codon after each start codon, if it is in the same sequence and frame
+	next_stop = stop_keys[np.minimum(np.searchsorted(stop_keys, start_keys, side='right'), len(stop_keys)-1)]
+	has_stop = (next_stop > start_keys) & (next_stop // span == start_keys // span)
+	start_keys = start_keys[has_stop]
+	orf_lengths = next_stop[has_stop] - start_keys
+	if len(start_keys)==0:
+		return orf_table
+
+	#the last ORF of each sequence and frame, ordered by length then start, is the longest
+	groups = start_keys // span
+	order = np.lexsort((start_keys, orf_lengths, groups))
+	best = order[np.flatnonzero(np.append(groups[order][1:]!=groups[order][:-1], True))]
+	orf_starts = start_keys[best] % span
+	orf_table[groups[best]//3, groups[best]%3] = np.column_stack((orf_starts, orf_starts + orf_lengths[best], orf_lengths[best]))
+	return orf_table
+
+def orfPeptides(seqs, orfs):
+	'''
+	Translates the ORFs in *orfs*, an array of (start, stop, length) rows, of
+	the sequences *seqs*. Sequences without an ORF get an empty peptide.
+	'''
+	peptides = ['' for s in seqs]
+	for i in np.flatnonzero(orfs[:,2] > 0):
+		peptides[i] = translate(seqs[i][orfs[i,0]:orfs[i,1]], 0, 0)
+	return peptides
+
+def annotateORFs(df, sequence='sequence', start_phase='startPhase', end_phase='endPhase', only_noncoding=True, frame_peptides=True):
+	'''
+	Adds the longest ORF in each frame of each exon in *df* as columns.
+
+	INPUT
+		df : pandas DataFrame, with one exon per index
+		sequence, start_phase, end_phase : names of the corresponding columns in *df*
+		only_noncoding : bool, only search the exons with (start phase, end phase)
+			= (-1, -1)
+		frame_peptides : bool, add the ``orf_peptide_f'' columns. Translation
+			only needs ``orf_peptide'', so it can skip translating the other frames.
+
+	RETURNS
+		pandas DataFrame, a copy of *df* with the new ORF columns
+
+	'''
+	df = df.copy()
+	seqs = [i if type(i)==type('') else '' for i in df[sequence]]
+	if only_noncoding:
+		#exons with a missing phase are not taken as noncoding
+		noncoding = ((pd.to_numeric(df[start_phase], errors='coerce')<0) & (pd.to_numeric(df[end_phase], errors='coerce')<0)).values
+		seqs = [s if n else '' for s, n in zip(seqs, noncoding)]
+
+	lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+	offsets = np.cumsum(lengths+1) - (lengths+1)
+	starts, stops = codonMasks('|'.join(seqs))
+	orf_table = longestORFs(starts, stops, offsets, lengths)
+
+	#longest ORF over all frames, breaking ties in favor of the furthest downstream start
+	best_frame = np.argmax(orf_table[:,:,2]*(len(starts)+2) + orf_table[:,:,0] + 1, axis=1) if len(seqs) else np.zeros(0, dtype=np.int64)
+	rows = np.arange(len(seqs))
+	has_orf = orf_table[rows,best_frame,2] > 0
+
+	peptides = []
+	for frame in range(3):
+		df['orf_start_%d' % frame] = orf_table[:,frame,0]
+		df['orf_stop_%d' % frame] = orf_table[:,frame,1]
+		df['orf_length_%d' % frame] = orf_table[:,frame,2]
+		if frame_peptides:
+			peptides.append(orfPeptides(seqs, orf_table[:,frame]))
+			df['orf_peptide_%d' % frame] = peptides[frame]
+	df['orf_start'] = orf_table[rows,best_frame,0]
+	df['orf_stop'] = orf_table[rows,best_frame,1]
+	df['orf_length'] = orf_table[rows,best_frame,2]
+	df['orf_frame'] = np.where(has_orf, best_frame, -1)
+	if frame_peptides:
+		df['orf_peptide'] = [peptides[f][i] for i, f in enumerate(best_frame)]
+	else:
+		df['orf_peptide'] = orfPeptides(seqs, orf_table[rows,best_frame])
+	return df
+
+def annotateORFFile(filename, outname=None, sequence='sequence', start_phase='startPhase', end_phase='endPhase', only_noncoding=True):
+	'''
+	Reads a CSV of exons, annotates their ORFs with *annotateORFs* and writes the result.
+
+	INPUT
+		filename : string, name of Pandas-style CSV with the exon sequences
+		outname : string, name of file to write to. Defaults to *filename*.
+
+	RETURNS
+		pandas DataFrame
+
+	'''
+	df = annotateORFs(pd.read_csv(filename), sequence=sequence, start_phase=start_phase, end_phase=end_phase, only_noncoding=only_noncoding)
+	df.to_csv(outname if outname else filename, index=False)
+	return df
+
+def annotateORFStore(store, outstore=None, sequence='sequence', start_phase='startPhase', end_phase='endPhase', only_noncoding=True):
+	'''
+	Annotates the ORFs of all transcripts in a transcript store. The exons of
+	each shard are annotated together with *transformStore*.
+
+	INPUT
+		store : string, the transcript store directory
+		outstore : string, the store directory to write to. If not given, *store*
+			is replaced with the annotated store.
+
+	RETURNS
+		<None> (writes to file)
+
+	'''
+	transcriptStore.transformStore(store, lambda df: annotateORFs(df, sequence=sequence, start_phase=start_phase, end_phase=end_phase, only_noncoding=only_noncoding), outstore=outstore)
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	kwargs = dict(start_phase=args.startphase, end_phase=args.endphase, only_noncoding=not args.all)
+	if transcriptStore.isStore(args.infile):
+		annotateORFStore(args.infile, outstore=args.outfile, **kwargs)
+	elif os.path.isdir(args.infile):
+		for f in [i for i in os.listdir(args.infile) if '.csv' in i]:
+			annotateORFFile('%s/%s' % (args.infile, f), **kwargs)
+	else:
+		annotateORFFile(args.infile, outname=args.outfile, **kwargs)
+	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('orfs').parse_args())
@@ -2,14 +2,15 @@
 catCSV.py -- concatenate multiple CSVs into a single CSV
 '''
 import pandas as pd
-import argparse
 import os
+import transcriptStore
 
 def catCSV(dir_name, outname, no_header=False, exclude=[]):
 	'''
 	First, checks to see if the directory *dir_name*. If so, finds all of the CSVs
 	inside of it and opens them with pandas. The program then attempts to
-	concatenate them. Files must all be of the same type.
+	concatenate them. Files must all be of the same type. If *dir_name* is a
+	transcript store, the transcripts in the store are concatenated instead.
 
 	INPUT
 		dir_name : string, name of the directory containing the CSVs
@@ -25,6 +26,12 @@ def catCSV(dir_name, outname, no_header=False, exclude=[]):
 	if not os.path.isdir(dir_name):
 		print "Could not find the directory %s in the current working directory." % dir_name
 		exit(1)
+	elif transcriptStore.isStore(dir_name):
+		print "Found transcript store %s" % dir_name
+		result = pd.concat([df for t, df in transcriptStore.iterTranscripts(dir_name)], ignore_index=True)
+		result.to_csv(outname,index=False)
+		print "Writing to %s" % outname
+		return result
 	else:
 		print "Found directory %s" % dir_name
 		fs = ['%s/%s' % (dir_name, i) for i in os.listdir(dir_name) if ('.csv' in i) and (i not in exclude)]
@@ -48,12 +55,13 @@ def catCSV(dir_name, outname, no_header=False, exclude=[]):
 				print 'Could not concatenate the CSV files in directory %s' % dir_name
 				exit(1)
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='concatenate all CSVs in a given directory into a single CSV.')
-	parser.add_argument('directory', type=str, help='name of the directory containing the CSVs to be concatenated. All CSVs must have the ``.csv'' suffix.')
-	parser.add_argument('outfile', type=str, help='name of file to write concatenated CSVs to')
-	parser.add_argument('-n', '--noheader', action='store_true', help='target CSVs do not have header lines.')
-	parser.add_argument('-e', '--exclude', action='append', dest='files_to_exclude', help='files to exclude from the concatenation')
-	args = parser.parse_args()
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
 	catCSV(args.directory, args.outfile, no_header=args.noheader, exclude=args.files_to_exclude)
 	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('cat').parse_args())
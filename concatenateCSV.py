@@ -3,7 +3,7 @@ concatenateCSV.py -- join a list of CSVs into a large CSV.
 '''
 import pandas as pd
 import os
-import argparse
+import transcriptStore
 
 def concatenateCSV(filenames, outfile):
 	if len(filenames)==0:
@@ -50,26 +50,24 @@ def generateCSVListFromDirectory(dir_name):
 		list of string, the files in that directory
 
 	'''
+	if transcriptStore.isStore(dir_name):
+		raise ValueError('%s is a transcript store; use catCSV.py to concatenate its transcripts' % dir_name)
 	x = os.listdir(dir_name)
 	x = [i for i in x if '.csv' in i]
 	x = ['%s/%s' % (dir_name, i) for i in x]
 	return x
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='concatenate similar CSVs into a single CSV')
-	parser.add_argument('-i', '--infile', type=str, help='file containing a list of CSVs to be concatenated')
-	parser.add_argument('-o', '--outfile', type=str, help='CSV to write the concatenated information to', required=True)
-	parser.add_argument('-s', '--delimiter', type=str, help='delimiter used in the infile. default newline.', default='\n')
-	parser.add_argument('-d', '--directory', type=str, help='directory containing the files to be concatenated')
-
-	args = parser.parse_args()
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
 	if args.directory:
 		try:
 			target_files = generateCSVListFromDirectory(args.directory)
 			concatenateCSV(target_files, args.outfile)
 			print "Finished"
-		except ValueError:
-			print "Encountered directory error."
+		except ValueError as e:
+			print "Encountered directory error: %s" % e
 			exit(1)
 	elif args.infile:
 		try:
@@ -82,3 +80,7 @@ if __name__=='__main__':
 	else:
 		print "Incorrect input; see usage."
 		exit(1)
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('concatenate').parse_args())
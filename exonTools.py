@@ -0,0 +1,143 @@
+'''
+exonTools.py -- a single command-line entry point for the programs in this
+package, with one subcommand for each program:
+
+	python exonTools.py readbiomart -i exons.fa -j header.csv -o exons.csv
+	python exonTools.py segment exons.csv -o transcripts
+	python exonTools.py translate transcripts
+
+Only the standard library is imported until a subcommand has been chosen, so
+``--help`` and argument errors return immediately. The program for the chosen
+subcommand, along with pandas, numpy and any database connection it needs, is
+then imported and its *main* function is run with the parsed arguments.
+
+The command-line arguments of every program are defined here, and the programs
+build their own parsers with *buildParser* when run directly.
+'''
+import sys
+import argparse
+import importlib
+from collections import OrderedDict
+
+def arg(*args, **kwargs):
+	return (args, kwargs)
+
+# subcommand : (program, description, arguments)
+subcommands = OrderedDict([
+	('readbiomart', ('readBiomart', 'read FASTA files in ENSEMBL BioMart output format and write to CSV', [
+		arg('-i', '--infile', type=str, help='FASTA file containing the BioMart sequence information'),
+		arg('-j', '--headerfile', type=str, help='CSV containing the names of the FASTA columns'),
+		arg('-o', '--outfile', type=str, help='file to write results to'),
+		arg('-z', '--zero', action='store_true', help='convert all values to int if possible and replace empty values with 0'),
+		arg('-p', '--processes', type=int, help='parse the file in parallel with this many processes. 0 uses all cores.', default=None)])),
+	('segment', ('segmentTranscripts', 'split a sequence CSV into separate CSVs, one for each transcript', [
+		arg('infile', type=str, help='Pandas-format CSV containing the sequence information'),
+		arg('-c', '--column', type=str, help="name of the column to split the file by. Default: ``transcript_id''", default='transcript_id'),
+		arg('-o', '--outdir', type=str, help='directory to output to', default=None),
+		arg('-s', '--sort', type=str, help="name of the column to sort the values by. Default is ``rank''", default='rank'),
+		arg('-n', '--shards', type=int, help='write a transcript store with this many shard files to OUTDIR instead of one CSV per transcript', default=None),
+		arg('--normalize', action='store_true', help='write a table of unique exons and a table of transcript exons to OUTDIR instead of one CSV per transcript'),
+		arg('-e', '--exoncolumn', type=str, help="name of the exon ID column, used with --normalize. Default: ``exon_id''", default='exon_id')])),
+	('orfs', ('annotateORFs', 'find the longest ORF in each frame of the noncoding exons in a CSV', [
+		arg('infile', type=str, help='Pandas-style CSV with exon sequences, directory of such CSVs, or transcript store directory'),
+		arg('-o', '--outfile', type=str, help='file or store to write to. Default: overwrite INFILE', default=None),
+		arg('-a', '--all', action='store_true', help='search all exons, not only those with phases (-1, -1)'),
+		arg('--startphase', type=str, help="name of the start phase column. default: ``startPhase''.", default='startPhase'),
+		arg('--endphase', type=str, help="name of the end phase column. default: ``endPhase''.", default='endPhase')])),
+	('translate', ('translateExon', 'given a CSV with exon sequences, translate them with the correct phase', [
+		arg('infile', type=str, help='file or directory of files with exons corresponding to a single transcript, or a transcript store directory'),
+		arg('--startphase', type=str, help="name of the start phase column. default: ``startPhase''.", default='startPhase'),
+		arg('--endphase', type=str, help="name of the end phase column. default: ``endPhase''.", default='endPhase'),
+		arg('--rank', type=str, help="name of the rank column. default: ``rank''.", default='rank'),
+		arg('-t', '--transcript', type=str, help='if INFILE is a transcript store, translate only this transcript', default=None),
+		arg('-o', '--outstore', type=str, help='if INFILE is a transcript store, write the translated store here instead of replacing INFILE', default=None)])),
+	('translatenormalized', ('translateNormalized', 'translate the unique exon and transcript exon tables written by segment --normalize', [
+		arg('exonfile', type=str, help='CSV of unique exons'),
+		arg('mappingfile', type=str, help='CSV of transcript exons'),
+		arg('-c', '--column', type=str, help="name of the transcript ID column, as given to segment -c. default: ``transcript_id''.", default='transcript_id'),
+		arg('-e', '--exoncolumn', type=str, help="name of the exon ID column. default: ``exon_id''.", default='exon_id'),
+		arg('--startphase', type=str, help="name of the start phase column. default: ``startPhase''.", default='startPhase'),
+		arg('--endphase', type=str, help="name of the end phase column. default: ``endPhase''.", default='endPhase'),
+		arg('--rank', type=str, help="name of the rank column. default: ``rank''.", default='rank')])),
+	('entropy', ('sequenceEntropy', 'calculate the entropy of peptide sequences contained in a CSV', [
+		arg('infile', type=str, help='name of Pandas-style CSV with peptide sequences, or name of directory containing CSV files'),
+		arg('-c', '--column', type=str, help='name of peptide-containing column in the CSV', default='protein')])),
+	('stats', ('sequenceStatistics', 'calculate statistics of the peptide sequences contained in a CSV in a single pass', [
+		arg('infile', type=str, help='name of Pandas-style CSV with peptide sequences, directory containing CSV files, or transcript store directory'),
+		arg('-c', '--column', type=str, help='name of peptide-containing column in the CSV', default='protein'),
+		arg('-s', '--stats', type=str, help='comma-separated list of statistics to calculate, from length, entropy, composition, molecular_weight, fraction_X, fraction_Z. Default: all.', default=None),
+		arg('-o', '--outfile', type=str, help='file or store to write to. Default: overwrite INFILE', default=None)])),
+	('protein', ('printFullProtein', 'given a transcript file, prints the sequence of the full protein', [
+		arg('infile', type=str, help='name of the transcript file, which must contain a translated protein column and be sorted by rank. A transcript ID if --store is given.'),
+		arg('-c', '--column', type=str, help="name of the column containing the protein sequences. default ``protein''.", default='protein'),
+		arg('-s', '--store', type=str, help='transcript store directory to read the transcript INFILE from', default=None)])),
+	('cat', ('catCSV', 'concatenate all CSVs in a given directory into a single CSV.', [
+		arg('directory', type=str, help='name of the directory containing the CSVs to be concatenated. All CSVs must have the ``.csv\'\' suffix.'),
+		arg('outfile', type=str, help='name of file to write concatenated CSVs to'),
+		arg('-n', '--noheader', action='store_true', help='target CSVs do not have header lines.'),
+		arg('-e', '--exclude', action='append', dest='files_to_exclude', help='files to exclude from the concatenation')])),
+	('concatenate', ('concatenateCSV', 'concatenate similar CSVs into a single CSV', [
+		arg('-i', '--infile', type=str, help='file containing a list of CSVs to be concatenated'),
+		arg('-o', '--outfile', type=str, help='CSV to write the concatenated information to', required=True),
+		arg('-s', '--delimiter', type=str, help='delimiter used in the infile. default newline.', default='\n'),
+		arg('-d', '--directory', type=str, help='directory containing the files to be concatenated')])),
+	('longest', ('getLongestTranscript', 'take the longest transcript for each gene', [
+		arg('infile', type=str, help="CSV input file. must contain `transcript_id', `gene_id', and `transcript_length' columns"),
+		arg('outfile', type=str, help="file to write results to")])),
+	('canonical', ('getCanonicalTranscripts', 'find the canonical transcripts for a list of ENSEMBL gene IDs', [
+		arg('-i', '--infile', type=str, help='file containing newline-delimited list of genes', required=True),
+		arg('-o', '--outfile', type=str, help='file to write the canonical transcript list to', required=True),
+		arg('-s', '--startindex', type=int, help='position in the gene list to start at. Default 0.', default=0),
+		arg('-e', '--stopindex', type=int, help='position in the gene list to stop at. Default None.', default=0)])),
+	('store', ('transcriptStore', 'list the transcripts in a transcript store, or print one of them as CSV', [
+		arg('store', type=str, help='transcript store directory'),
+		arg('-t', '--transcript', type=str, help='ID of a transcript to print', default=None)])),
+	('serve', ('translateServer', 'serve translations of sequences and transcripts over HTTP on localhost', [
+		arg('-p', '--port', type=int, help='port to listen on. default 8765.', default=8765),
+		arg('-s', '--store', type=str, help='transcript store directory to read transcripts from', default=None),
+		arg('-d', '--directory', type=str, help='directory of transcript CSVs, named <transcript ID>.csv', default=None),
+		arg('-c', '--cachesize', type=int, help='number of translated transcripts to keep in memory. default 10000.', default=10000),
+		arg('-w', '--window', type=float, help='seconds to wait for concurrent requests to batch together. default 0.005.', default=0.005)])),
+	('verify', ('verifyTranslation', 'check the optimized translation paths against the reference implementation on a synthetic corpus, and measure their throughput', [
+		arg('-n', '--transcripts', type=int, help='number of synthetic transcripts. default 2000.', default=2000),
+		arg('-s', '--seed', type=int, help='random seed for the corpus. default 0.', default=0),
+		arg('-b', '--baseline', type=str, help='JSON file of throughputs to check against', default=None),
+		arg('-r', '--record', action='store_true', help='write the measured throughputs to the baseline file instead of checking them'),
+		arg('-t', '--tolerance', type=float, help='fraction by which throughput may fall below the baseline. default 0.3.', default=0.3),
+		arg('-g', '--golden', type=str, help='JSON file of reference proteins to write or check against', default=None),
+		arg('-m', '--minspeedup', type=float, help='minimum ratio of optimized to reference throughput for every path. 0 disables the check. default: the ratios in verifyTranslation.minimumSpeedups.', default=None)])),
+])
+
+def addArguments(parser, subcommand):
+	for args, kwargs in subcommands[subcommand][2]:
+		parser.add_argument(*args, **kwargs)
+	return parser
+
+def buildParser(subcommand=None):
+	'''
+	Builds the argument parser for a single subcommand, as used by each program
+	when run directly, or for all subcommands if *subcommand* is not given.
+
+	RETURNS
+		argparse.ArgumentParser
+
+	'''
+	if subcommand:
+		return addArguments(argparse.ArgumentParser(description=subcommands[subcommand][1]), subcommand)
+	parser = argparse.ArgumentParser(description='tools for translating protein-encoding exons in phase')
+	subparsers = parser.add_subparsers(dest='subcommand', metavar='subcommand')
+	for name in subcommands:
+		addArguments(subparsers.add_parser(name, help=subcommands[name][1], description=subcommands[name][1]), name)
+	return parser
+
+def main(argv=None):
+	'''
+	Parses the command line, then imports the program for the chosen
+	subcommand and runs it.
+	'''
+	args = buildParser().parse_args(argv)
+	program = importlib.import_module(subcommands[args.subcommand][0])
+	program.main(args)
+
+if __name__=='__main__':
+	main(sys.argv[1:])
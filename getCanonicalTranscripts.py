@@ -3,10 +3,19 @@ getCanonicalTranscripts.py -- retrieve the ENSEMBL stable IDs for the ENSEMBL
 canonical transcripts, given a list of ENSEMBL gene IDs. Note: the latest
 release of ENSEMBL as of 11/19/2016 is 86.
 '''
-from cogent.db.ensembl import Genome
-human=Genome('human', 86, None)
 import pandas as pd
-import argparse
+
+human=None
+
+def getHumanGenome():
+	'''
+	Returns the ENSEMBL human genome database, connecting on the first call.
+	'''
+	global human
+	if human is None:
+		from cogent.db.ensembl import Genome
+		human=Genome('human', 86, None)
+	return human
 
 def readGenes(filename):
 	'''
@@ -31,7 +40,7 @@ def getCanonicalTranscripts(geneList, startIndex=0, stopIndex=None):
     result=pd.DataFrame(columns=['geneID', 'transcriptID'])
     for geneID in geneList[startIndex:stopIndex]:
         try:
-            geneObj=human.getGeneByStableId(StableId=geneID)
+            geneObj=getHumanGenome().getGeneByStableId(StableId=geneID)
             transcriptID=geneObj.CanonicalTranscript.StableId
             print geneID, transcriptID
             newRow = pd.Series([geneID, transcriptID], index=['geneID', 'transcriptID'])
@@ -47,13 +56,13 @@ def writeCanonicalTranscript(geneList, outName, startIndex=None, stopIndex=None)
     geneTranscriptDF=getCanonicalTranscripts(geneList, startIndex=startIndex, stopIndex=stopIndex)
     geneTranscriptDF.to_csv(outName,index=False)
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='find the canonical transcripts for a list of ENSEMBL gene IDs')
-	parser.add_argument('-i', '--infile', type=str, help='file containing newline-delimited list of genes', required=True)
-	parser.add_argument('-o', '--outfile', type=str, help='file to write the canonical transcript list to', required=True)
-	parser.add_argument('-s', '--startindex', type=int, help='position in the gene list to start at. Default 0.', default=0)
-	parser.add_argument('-e', '--stopindex', type=int, help='position in the gene list to stop at. Default None.', default=0)
-
-	args = parser.parse_args()
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
 	f = readGenes(args.infile)
 	writeCanonicalTranscript(f, args.outfile, startIndex=args.startindex, stopIndex=args.stopindex)
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('canonical').parse_args())
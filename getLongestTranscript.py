@@ -5,7 +5,6 @@ exon analyses.
 '''
 import pandas as pd
 import numpy as np
-import argparse
 
 def getLongestTranscript(filename, outname, columns=['gene_id', 'transcript_length', 'transcript_id']):
 	'''
@@ -36,14 +35,18 @@ def getLongestTranscript(filename, outname, columns=['gene_id', 'transcript_leng
 	df.to_csv(outname,index=False)
 	return df
 	
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='take the longest transcript for each gene')
-	parser.add_argument('infile', type=str, help="CSV input file. must contain `transcript_id', `gene_id', and `transcript_length' columns")
-	parser.add_argument('outfile', type=str, help="file to write results to")
-	args = parser.parse_args()
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
 	try:
 		getLongestTranscript(args.infile, args.outfile)
 	except (KeyError, ValueError) as e2:
 		print "Error: input file must contains columns `gene_id', `transcript_id', and `transcript_length'."
 		exit(1)
 	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('longest').parse_args())
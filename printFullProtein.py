@@ -1,23 +1,50 @@
 '''
 printFullProtein.py -- given a translated transcript file, prints the
 full amino acid sequence of the protein. The transcript file must be
-translated.
+translated. The transcript may also be read from a transcript store.
 '''
 import pandas as pd
-import argparse
+import transcriptStore
 
-def printFullProtein(filename, column='protein'):
-	f = pd.read_csv(filename)
+def printFullProtein(filename, column='protein', store=None):
+	'''
+	Prints the full protein sequence of a translated transcript.
+
+	INPUT
+		filename : string, name of the translated transcript file, or a
+			transcript ID if *store* is given
+		column : string, name of the column containing the protein sequences
+		store : string, name of a transcript store directory containing the
+			transcript *filename*
+
+	'''
+	if store:
+		f = transcriptStore.readTranscript(store, filename)
+	else:
+		f = pd.read_csv(filename)
+	print fullProtein(f, column=column)
+
+def fullProtein(df, column='protein'):
+	'''
+	Joins the peptides of the exons of a translated transcript, in the order
+	of *df*, into the full protein sequence.
+
+	RETURNS
+		string
+
+	'''
 	full_protein = ''
-	for i in f.index:
-		if type(f.ix[i,column])==type(''):
-			full_protein = full_protein + f.ix[i,column]
-	print full_protein
+	for i in df.index:
+		if type(df.ix[i,column])==type(''):
+			full_protein = full_protein + df.ix[i,column]
+	return full_protein
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='given a transcript file, prints the sequence of the full protein')
-	parser.add_argument('infile', type=str, help='name of the transcript file, which must contain a translated protein column and be sorted by rank.')
-	parser.add_argument('-c', '--column', type=str, help="name of the column containing the protein sequences. default ``protein''.", default='protein')
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	printFullProtein(args.infile, column=args.column, store=args.store)
 
-	args = parser.parse_args()
-	printFullProtein(args.infile, column=args.column)
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('protein').parse_args())
@@ -1,13 +1,21 @@
 '''
 segmentTranscripts.py -- split a CSV containing sequences from
 many genes into separate files, one for each transcript
+
+Alternatively, the CSV can be normalized into a table of unique exons and a
+table relating each transcript and rank to an exon, so that exons shared by
+several transcripts are stored and translated only once (see
+*translateNormalized*).
 '''
-import argparse
 import os
 import numpy as np
 import pandas as pd
+from transcriptStore import writeStore
+
+EXON_TABLE_NAME = 'exons.csv'
+MAPPING_TABLE_NAME = 'transcript_exons.csv'
 
-def segmentTranscripts(filename, transcript_column='transcript_id', sort_by='rank', out_prefix=None):
+def segmentTranscripts(filename, transcript_column='transcript_id', sort_by='rank', out_prefix=None, n_shards=None, normalize=False, exon_column='exon_id'):
 	'''
 	Split the lines in a sequence CSV into separate files, one for each transcript.
 	Assumes that each index in the CSV has a single transcript in its ID field.
@@ -19,7 +27,18 @@ def segmentTranscripts(filename, transcript_column='transcript_id', sort_by='ran
 			IDs
 		
 		out_prefix : string, prefix to be appended to the transcript names in 
-			generating the output filenames
+			generating the output filenames. If *n_shards* is set, the name of
+			the transcript store directory instead.
+
+		n_shards : int, if set, write the transcripts to a transcript store with
+			this many shard files rather than to one CSV per transcript
+
+		normalize : bool, if set, write a table of unique exons and a table of
+			transcript exons to the directory *out_prefix* with *normalizeExons*,
+			rather than one CSV per transcript
+
+		exon_column : string, name of the column containing the exon IDs, used
+			if *normalize*
 
 	RETURNS
 		<None>
@@ -29,14 +48,20 @@ def segmentTranscripts(filename, transcript_column='transcript_id', sort_by='ran
 	if transcript_column not in f.columns:
 		print "Cannot find the transcript ID column ``%s'' in the file. File has columns %r" % (transcript_column, f.columns)
 		exit(1)
+	elif normalize:
+		exons, mapping = normalizeExons(f, transcript_column=transcript_column, exon_column=exon_column, rank=sort_by)
+		if not os.path.isdir(out_prefix):
+			os.mkdir(out_prefix)
+		exons.to_csv('%s/%s' % (out_prefix, EXON_TABLE_NAME), index=False)
+		mapping.to_csv('%s/%s' % (out_prefix, MAPPING_TABLE_NAME), index=False)
+		print "%d unique exons in %d transcript exons" % (len(exons), len(mapping))
 	else:
 		f = splitIndices(f, transcript_column)
-		unique_transcripts = np.unique(f[transcript_column])
-		for transcript in unique_transcripts:
+		if n_shards:
+			writeStore(iterTranscriptDFs(f, transcript_column, sort_by), out_prefix, n_shards=n_shards)
+			return
+		for transcript, transcript_df in iterTranscriptDFs(f, transcript_column, sort_by):
 			print transcript, out_prefix
-			transcript_df = f[f[transcript_column]==transcript]
-			transcript_df = transcript_df.sort_values(by=sort_by)
-			transcript_df = transcript_df.set_index(sort_by, drop=False)
 			if (not out_prefix) or (len(out_prefix)==0):
 				transcript_df.to_csv('%s.csv' % transcript, index=False)
 			elif out_prefix[-1]=='/':
@@ -44,6 +69,93 @@ def segmentTranscripts(filename, transcript_column='transcript_id', sort_by='ran
 			else:
 				transcript_df.to_csv('%s_%s.csv' % (out_prefix, transcript), index=False)
 
+def iterTranscriptDFs(df, transcript_column='transcript_id', sort_by='rank'):
+	'''
+	Iterates over the transcripts in *df*, yielding the rows for each transcript
+	sorted and indexed by *sort_by*.
+
+	RETURNS
+		generator of (transcript_id, pandas DataFrame) pairs
+
+	'''
+	for transcript in np.unique(df[transcript_column]):
+		transcript_df = df[df[transcript_column]==transcript]
+		transcript_df = transcript_df.sort_values(by=sort_by)
+		transcript_df = transcript_df.set_index(sort_by, drop=False)
+		yield transcript, transcript_df
+
+def normalizeExons(df, transcript_column='transcript_id', exon_column='exon_id', rank='rank', delimiter=';', start_phase='startPhase', end_phase='endPhase'):
+	'''
+	Splits a sequence table into a table of unique exons and a table relating
+	each transcript and rank to an exon. Unlike *splitIndices*, exons listed
+	under several transcripts are not copied.
+
+	Rows with more than one transcript in their *transcript_column* are mapped
+	to each of them. If the *rank* field of such a row has the same number of
+	values, each transcript gets its own rank; otherwise the rank is shared.
+
+	Phases belong to the transcript rather than the exon: the same exon can be
+	coding in one isoform and noncoding in another. Exons are therefore keyed by
+	their ID and phases, and both tables carry the phase columns. The exon table
+	also carries the sequence and every other column whose value is the same in
+	all rows of each exon. Columns that differ between the rows of an exon, such
+	as transcript lengths or cDNA coordinates, are per-transcript and are moved
+	to the mapping table, with the values of the row they came from.
+
+	INPUT
+		df : pandas DataFrame, with one exon per index
+		transcript_column, exon_column, rank : names of the corresponding columns
+			in *df*. If there is no *exon_column*, exons are identified by their
+			sequence and phases, in a new ``exon_key'' column.
+		delimiter : string, separator of multiple values in a field
+
+	RETURNS
+		(exons, mapping) : pandas DataFrames. *exons* has one row for each unique
+			exon and pair of phases, and no transcript or rank columns; *mapping*
+			has the columns *transcript_column*, *rank*, *exon_column*,
+			*start_phase* and *end_phase*, followed by any per-transcript
+			columns, sorted by transcript and rank.
+
+	'''
+	df = df.reset_index(drop=True)
+	if exon_column not in df.columns:
+		exon_column = 'exon_key'
+		df[exon_column] = pd.factorize(df['sequence'].astype(str) + '|' + df[start_phase].astype(str) + '|' + df[end_phase].astype(str))[0]
+	key_columns = [exon_column, start_phase, end_phase]
+	n_exons = len(df[key_columns].drop_duplicates())
+	exon_columns = key_columns + ['sequence']
+	other_columns = [c for c in df.columns if c not in exon_columns + [transcript_column, rank]]
+	transcript_columns = [c for c in other_columns if len(df[key_columns + [c]].drop_duplicates())!=n_exons]
+	exon_columns = exon_columns + [c for c in other_columns if c not in transcript_columns]
+
+	rows = []
+	for row, exon, transcripts, ranks in zip(df.index, df[exon_column], df[transcript_column].astype(str), df[rank].astype(str)):
+		transcripts = transcripts.split(delimiter)
+		ranks = ranks.split(delimiter)
+		if len(ranks)!=len(transcripts):
+			ranks = [ranks[0] for t in transcripts]
+		rows.extend([(t, int(float(r)), exon, row) for t, r in zip(transcripts, ranks)])
+	mapping = pd.DataFrame(rows, columns=[transcript_column, rank, exon_column, 'row'])
+	mapping = mapping.join(df[[start_phase, end_phase] + transcript_columns], on='row').drop('row', axis=1)
+	mapping = mapping.drop_duplicates([transcript_column, rank]).sort_values(by=[transcript_column, rank])
+	exons = df[[c for c in df.columns if c in exon_columns]].drop_duplicates(key_columns)
+	return exons, mapping
+
+def denormalizeExons(exons, mapping, exon_column='exon_id', start_phase='startPhase', end_phase='endPhase'):
+	'''
+	Joins the tables from *normalizeExons* back into one row per transcript exon.
+	Mapping tables without phase columns, as written before exons were keyed by
+	their phases, are joined on the exon ID alone.
+
+	RETURNS
+		pandas DataFrame
+
+	'''
+	if exon_column not in mapping.columns:
+		exon_column = 'exon_key'
+	keys = [exon_column] + [c for c in [start_phase, end_phase] if c in mapping.columns]
+	return mapping.merge(exons, on=keys, how='left')
+
 def splitIndices(df, column, delimiter=';'):
 	'''
 	For indices that have more than one value at the attribute *column*,
@@ -67,22 +179,27 @@ def splitIndices(df, column, delimiter=';'):
 			df.ix[i, column]=new_row_transcripts[0]
 	return df
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='split a sequence CSV into separate CSVs, one for each transcript')
-	parser.add_argument('infile', type=str, help='Pandas-format CSV containing the sequence information')
-	parser.add_argument('-c', '--column', type=str, help="name of the column to split the file by. Default: ``transcript_id''", default='transcript_id')
-	parser.add_argument('-o', '--outdir', type=str, help='directory to output to', default=None)
-	parser.add_argument('-s', '--sort', type=str, help="name of the column to sort the values by. Default is ``rank''", default='rank')
-	args = parser.parse_args()
-
-	if args.outdir:
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	if args.shards or args.normalize:
+		if not args.outdir:
+			print "An output directory must be given with -o when writing shards or normalized tables."
+			exit(1)
+		out_prefix = args.outdir
+	elif args.outdir:
 		if not os.path.isdir(args.outdir):
 			os.mkdir(args.outdir)
 		out_prefix = '%s/' % args.outdir
 	else:
 		out_prefix = None
 
-	f = segmentTranscripts(args.infile, transcript_column=args.column, sort_by=args.sort, out_prefix=out_prefix)
+	f = segmentTranscripts(args.infile, transcript_column=args.column, sort_by=args.sort, out_prefix=out_prefix, n_shards=args.shards, \
+		normalize=args.normalize, exon_column=args.exoncolumn)
 
 	print "Finished"
-	
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('segment').parse_args())
@@ -3,8 +3,8 @@ sequenceEntropy.py -- calculate the entropy of protein sequences
 '''
 import pandas as pd
 import math
-import argparse
 import os
+import transcriptStore
 
 amino_acids = ['A', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'K', 'L', 'M', 'N', 'P', 'Q', 'R', 'S', 'T', 'V', 'W', 'Y']
 
@@ -45,29 +45,54 @@ def sequenceEntropy(filename, peptide_column='protein', write_to_file=False, out
 	if peptide_column not in df.columns:
 		print "Did not find the column %s in dataframe %s" % (peptide_column, filename)
 		exit(1)
-	entropies = pd.Series([])
-	for i in df.index:
-		entropies.ix[i] = entropy(df.ix[i,peptide_column])
-	df['entropy']=entropies
+	df = addEntropy(df, peptide_column=peptide_column)
 	if write_to_file:
 		if not outname:
 			outname='%s_entropy.csv' % filename.replace('.csv','')
 		df.to_csv(outname,index=False)
 	return df
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='calculate the entropy of peptide sequences contained in a CSV')
-	parser.add_argument('infile', type=str, help='name of Pandas-style CSV with peptide sequences, or name of directory containing CSV files')
-	parser.add_argument('-c', '--column', type=str, help='name of peptide-containing column in the CSV', default='protein')
-	args = parser.parse_args()
-	if os.path.isdir(args.infile):
+def addEntropy(df, peptide_column='protein'):
+	'''
+	Adds an ``entropy'' column to *df* with the entropy of each peptide in
+	*peptide_column*.
+
+	RETURNS
+		Pandas DataFrame object, *df* with the added column
+
+	'''
+	#peptides shared by several transcripts are only calculated once
+	unique_entropies = {}
+	entropies = pd.Series([])
+	for i in df.index:
+		peptide = df.ix[i,peptide_column]
+		if type(peptide)!=type(''):
+			entropies.ix[i] = entropy(peptide)
+			continue
+		if peptide not in unique_entropies:
+			unique_entropies[peptide] = entropy(peptide)
+		entropies.ix[i] = unique_entropies[peptide]
+	df['entropy']=entropies
+	return df
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	if transcriptStore.isStore(args.infile):
+		transcriptStore.transformStore(args.infile, lambda df: addEntropy(df, peptide_column=args.column))
+	elif os.path.isdir(args.infile):
 		fs = [i for i in os.listdir(args.infile) if '.csv' in i]
 		for f in fs:
 			try:
 				sequenceEntropy('%s/%s' % (args.infile, f), peptide_column=args.column, write_to_file=True, outname='%s/%s' % (args.infile, f))
 				print 'successfully calculated entropy for %s' % f
-			except pandas.io.common.CParserError:
+			except pd.io.common.CParserError:
 				continue
 	else:
 		sequenceEntropy(args.infile, peptide_column=args.column, write_to_file=True, outname=args.infile)
 	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('entropy').parse_args())
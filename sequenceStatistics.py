@@ -0,0 +1,167 @@
+'''
+sequenceStatistics.py -- calculate several statistics of protein sequences in
+a single pass.
+
+All of the peptides in a table are concatenated into one buffer and encoded as
+residue indices, and the residue counts of every sequence are found at once.
+Each statistic is then calculated from the count matrix, so adding a statistic
+does not require another pass over the sequences. Identical peptides, such as
+those of exons shared by several transcripts, are counted only once.
+
+Available statistics (see *statistics*):
+	length : number of residues, including ``X'' and ``Z''
+	entropy : Shannon entropy, as calculated by *sequenceEntropy.entropy*
+	composition : fraction of each of the 20 amino acids, as columns ``frac_A'' etc.
+	molecular_weight : average molecular weight in Da of the standard residues
+	fraction_X : fraction of ``X'' (stop codon) residues
+	fraction_Z : fraction of ``Z'' (ambiguous codon) residues
+'''
+import os
+import numpy as np
+import pandas as pd
+from sequenceEntropy import amino_acids
+import transcriptStore
+
+# The residue alphabet: the 20 amino acids, then ``X'' and ``Z'' from codonTable,
+# then any other character.
+residues = amino_acids + ['X', 'Z']
+residueCodes = np.zeros(256, dtype=np.int64) + len(residues)
+for i, aa in enumerate(residues):
+	residueCodes[ord(aa)] = i
+
+# Average residue masses in Da, and the mass of the water added by the termini
+residueMasses = {'A': 71.0788, 'C': 103.1388, 'D': 115.0886, 'E': 129.1155,
+	'F': 147.1766, 'G': 57.0519, 'H': 137.1411, 'I': 113.1594, 'K': 128.1741,
+	'L': 113.1594, 'M': 131.1926, 'N': 114.1038, 'P': 97.1167, 'Q': 128.1307,
+	'R': 156.1875, 'S': 87.0782, 'T': 101.1051, 'V': 99.1326, 'W': 186.2132,
+	'Y': 163.1760}
+waterMass = 18.01528
+
+def residueCounts(sequences):
+	'''
+	Counts the residues of each of a list of peptide sequences.
+
+	INPUT
+		sequences : list of string
+
+	RETURNS
+		numpy array of shape (len(sequences), len(residues)+1), the counts of
+			each residue in *residues* and of other characters in the last column
+
+	'''
+	n_codes = len(residues) + 1
+	lengths = np.array([len(s) for s in sequences], dtype=np.int64)
+	buf = ''.join(sequences)
+	codes = residueCodes[np.frombuffer(buf, dtype=np.uint8)] if buf else np.zeros(0, dtype=np.int64)
+	seq_ids = np.repeat(np.arange(len(sequences)), lengths)
+	counts = np.bincount(seq_ids*n_codes + codes, minlength=len(sequences)*n_codes)
+	return counts.reshape((len(sequences), n_codes))
+
+def _fractions(counts):
+	lengths = counts.sum(axis=1).astype(float)
+	lengths[lengths==0] = np.nan
+	return counts / lengths[:,None]
+
+def statLength(counts):
+	return [('length', counts.sum(axis=1))]
+
+def statEntropy(counts):
+	freqs = _fractions(counts)[:,:len(amino_acids)]
+	with np.errstate(divide='ignore', invalid='ignore'):
+		terms = np.where(freqs>0, freqs*np.log(freqs), 0.0)
+	entropies = -1 * terms.sum(axis=1)
+	entropies[np.isnan(freqs[:,0])] = np.nan
+	return [('entropy', entropies)]
+
+def statComposition(counts):
+	freqs = _fractions(counts)
+	return [('frac_%s' % aa, freqs[:,i]) for i, aa in enumerate(amino_acids)]
+
+def statMolecularWeight(counts):
+	masses = np.array([residueMasses[aa] for aa in amino_acids])
+	weights = counts[:,:len(amino_acids)].dot(masses)
+	weights = np.where(counts[:,:len(amino_acids)].sum(axis=1)>0, weights + waterMass, 0.0)
+	return [('molecular_weight', weights)]
+
+def statFractionX(counts):
+	return [('fraction_X', _fractions(counts)[:,residues.index('X')])]
+
+def statFractionZ(counts):
+	return [('fraction_Z', _fractions(counts)[:,residues.index('Z')])]
+
+statistics = {'length': statLength, 'entropy': statEntropy, 'composition': statComposition,
+	'molecular_weight': statMolecularWeight, 'fraction_X': statFractionX, 'fraction_Z': statFractionZ}
+
+defaultStatistics = ['length', 'entropy', 'composition', 'molecular_weight', 'fraction_X', 'fraction_Z']
+
+def addSequenceStatistics(df, peptide_column='protein', stats=None):
+	'''
+	Calculates a set of statistics for each peptide in *df* and adds them as columns.
+	Rows without a peptide sequence get NaN.
+
+	INPUT
+		df : pandas DataFrame
+		peptide_column : name of the column in *df* that contains the protein sequence
+		stats : list of string, names of the statistics in *statistics* to
+			calculate. Default: all of them.
+
+	RETURNS
+		pandas DataFrame, a copy of *df* with the new columns
+
+	'''
+	if not stats:
+		stats = defaultStatistics
+	unknown = [i for i in stats if i not in statistics]
+	if unknown:
+		print "Unknown statistics %r; choose from %r" % (unknown, sorted(statistics.keys()))
+		exit(1)
+	df = df.copy()
+	has_peptide = np.array([type(i)==type('') for i in df[peptide_column]])
+	#peptides shared by several transcripts are only counted once
+	codes, unique_peptides = pd.factorize(pd.Series([i if type(i)==type('') else '' for i in df[peptide_column]], dtype=object))
+	counts = residueCounts(list(unique_peptides))
+	for stat in stats:
+		for column, values in statistics[stat](counts):
+			df[column] = np.where(has_peptide, values[codes], np.nan)
+	return df
+
+def sequenceStatistics(filename, peptide_column='protein', stats=None, outname=None):
+	'''
+	Given a CSV encoding a set of protein sequences, adds the columns from
+	*addSequenceStatistics* and writes the result.
+
+	INPUT
+		filename : string, name of Pandas-style CSV containing the protein information
+		peptide_column : name of the column in *filename* that contains the protein sequence
+		stats : list of string, names of the statistics to calculate
+		outname : string, name of file to write to. Defaults to *filename*.
+
+	RETURNS
+		Pandas DataFrame object, with the added columns
+
+	'''
+	df = pd.read_csv(filename)
+	if peptide_column not in df.columns:
+		print "Did not find the column %s in dataframe %s" % (peptide_column, filename)
+		exit(1)
+	df = addSequenceStatistics(df, peptide_column=peptide_column, stats=stats)
+	df.to_csv(outname if outname else filename, index=False)
+	return df
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	stats = args.stats.split(',') if args.stats else None
+	if transcriptStore.isStore(args.infile):
+		transcriptStore.transformStore(args.infile, lambda df: addSequenceStatistics(df, peptide_column=args.column, stats=stats), outstore=args.outfile)
+	elif os.path.isdir(args.infile):
+		for f in [i for i in os.listdir(args.infile) if '.csv' in i]:
+			sequenceStatistics('%s/%s' % (args.infile, f), peptide_column=args.column, stats=stats)
+	else:
+		sequenceStatistics(args.infile, peptide_column=args.column, stats=stats, outname=args.outfile)
+	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('stats').parse_args())
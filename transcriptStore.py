@@ -0,0 +1,321 @@
+'''
+transcriptStore.py -- keep the exon tables of many transcripts in a small
+number of shard files instead of one CSV per transcript.
+
+A store is a directory containing a handful of shard files and an index. Each
+shard is a concatenation of per-transcript CSV records (each with its own
+header line), and the index is a CSV relating each transcript ID to the shard,
+byte offset and byte length of its record. This allows random access to a
+single transcript with one seek and one read, and sequential scanning of all
+transcripts shard by shard. Shards have a ``.dat'' suffix so that programs
+scanning a directory for ``.csv'' files do not read them as transcript files.
+
+Records are never modified in place. Updating a transcript appends the new
+record to the end of its shard and points the index at it; *writeStore* can be
+used to write a compacted copy of a store.
+
+Shard files are numbered by generation as well as by shard, and the index
+records the generation it refers to. Writing a store into a directory writes a
+new generation of shards next to the old ones, and only then replaces the
+index, so an interrupted write leaves the directory as it was. Replacing the
+index is the only step that changes which records are read.
+'''
+import os
+import zlib
+from collections import OrderedDict
+from StringIO import StringIO
+import pandas as pd
+
+INDEX_NAME = 'index.csv'
+SHARD_NAME = 'shard_%03d.%d.dat'
+INDEX_COLUMNS = ['transcript_id', 'shard', 'offset', 'length', 'generation']
+
+def isStore(path):
+	'''
+	Returns *True* if *path* is a transcript store directory.
+	'''
+	return os.path.isdir(path) and os.path.isfile(os.path.join(path, INDEX_NAME))
+
+def shardForTranscript(transcript_id, n_shards):
+	'''
+	Choose the shard that a transcript is written to. Uses a CRC rather than
+	*hash* so that the assignment is stable between Python processes.
+	'''
+	return (zlib.crc32(str(transcript_id)) & 0xffffffff) % n_shards
+
+def shardPath(store_dir, shard, generation):
+	'''
+	Returns the file name of a shard of a store.
+	'''
+	return os.path.join(store_dir, SHARD_NAME % (shard, generation))
+
+def shardFiles(store_dir):
+	'''
+	Returns a list of the (shard, generation) pairs of the shard files in a store
+	directory, of every generation.
+	'''
+	files = []
+	for i in os.listdir(store_dir):
+		parts = i.split('.')
+		if i.startswith('shard_') and len(parts)==3 and parts[2]=='dat':
+			files.append((int(parts[0][len('shard_'):]), int(parts[1])))
+	return files
+
+def storeGeneration(store_dir, index=None):
+	'''
+	Returns the generation of the shards that the index of a store refers to.
+	An empty index refers to no records, so the latest generation is used.
+	'''
+	if index is None:
+		index = readIndex(store_dir)
+	if len(index):
+		return int(index['generation'].iloc[0])
+	return max([g for s, g in shardFiles(store_dir)] + [0])
+
+def writeStore(transcripts, store_dir, n_shards=16):
+	'''
+	Writes a set of transcripts to a new store. The shards are written as a new
+	generation and the index is replaced last, so that if writing fails the
+	new shards are removed and any store already in *store_dir* is unchanged.
+	Once the index has been replaced, the shards of older generations are removed.
+
+	INPUT
+		transcripts : iterable of (transcript_id, pandas DataFrame) pairs, one
+			for each transcript
+
+		store_dir : string, directory to write the store to. Created if it does
+			not exist.
+
+		n_shards : int, number of shard files to distribute the transcripts over
+
+	RETURNS
+		pandas DataFrame, the store index
+
+	'''
+	created = not os.path.isdir(store_dir)
+	if created:
+		os.mkdir(store_dir)
+	generation = max([g+1 for s, g in shardFiles(store_dir)] + [0])
+	committed = False
+	try:
+		shards = [open(shardPath(store_dir, i, generation), 'wb') for i in range(n_shards)]
+		rows = []
+		try:
+			for transcript_id, transcript_df in transcripts:
+				shard = shardForTranscript(transcript_id, n_shards)
+				record = transcript_df.to_csv(index=False)
+				rows.append((transcript_id, shard, shards[shard].tell(), len(record), generation))
+				shards[shard].write(record)
+		finally:
+			for s in shards:
+				s.close()
+		index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+		writeIndex(index, store_dir)
+		committed = True
+	finally:
+		#remove the new shards if the index was not replaced, or the old ones if it was
+		for shard, g in shardFiles(store_dir):
+			if (g==generation) != committed:
+				os.remove(shardPath(store_dir, shard, g))
+		if created and not os.listdir(store_dir):
+			os.rmdir(store_dir)
+	return index.set_index('transcript_id', drop=False)
+
+def countShards(store_dir, index=None):
+	'''
+	Returns the number of shard files in a store.
+	'''
+	generation = storeGeneration(store_dir, index=index)
+	return len([s for s, g in shardFiles(store_dir) if g==generation])
+
+def rewriteStore(store_dir, transcripts, outstore=None):
+	'''
+	Writes a new version of every transcript in a store, with the same number of
+	shards, usually from a generator reading *store_dir* with *iterTranscripts*.
+	The old records stay readable until the new index is in place, so a
+	generator reading *store_dir* can be written back to it.
+
+	INPUT
+		store_dir : string, the store directory
+		transcripts : iterable of (transcript_id, pandas DataFrame) pairs
+		outstore : string, the store directory to write to. Must not be
+			*store_dir*. If not given, *store_dir* is replaced with the new store.
+
+	RETURNS
+		<None> (writes to file)
+
+	'''
+	n_shards = countShards(store_dir)
+	if outstore and os.path.realpath(outstore)==os.path.realpath(store_dir):
+		raise ValueError('cannot rewrite store %s into itself; omit the output store to replace it' % store_dir)
+	writeStore(transcripts, outstore if outstore else store_dir, n_shards=n_shards)
+
+def transformStore(store_dir, function, outstore=None):
+	'''
+	Applies a function to the exons of all transcripts in a store, one shard at
+	a time. The exon tables of the transcripts in a shard that have the same
+	columns are concatenated, passed to *function*, and the result is split back
+	into transcripts and written with *rewriteStore*, so only one shard is held
+	in memory at once.
+
+	INPUT
+		store_dir : string, the store directory
+		function : function taking and returning a pandas DataFrame with the
+			same rows in the same order
+		outstore : string, the store directory to write to. If not given,
+			*store_dir* is replaced.
+
+	RETURNS
+		<None> (writes to file)
+
+	'''
+	index = readIndex(store_dir)
+	if len(index)==0:
+		if outstore:
+			rewriteStore(store_dir, [], outstore=outstore)
+		return
+
+	def transformShards():
+		for shard, shard_index in index.groupby('shard', sort=True):
+			transcript_ids, dfs = zip(*iterTranscripts(store_dir, index=shard_index))
+			#transcripts with different columns are transformed separately, so that
+			#none of them gains the columns of another or has its columns reordered
+			groups = OrderedDict()
+			for i, df in enumerate(dfs):
+				groups.setdefault(tuple(df.columns), []).append(i)
+			results = [None for t in transcript_ids]
+			for members in groups.values():
+				bounds = [0]
+				for i in members:
+					bounds.append(bounds[-1] + len(dfs[i]))
+				df = function(pd.concat([dfs[i] for i in members], ignore_index=True))
+				for j, i in enumerate(members):
+					results[i] = df.iloc[bounds[j]:bounds[j+1]]
+			for t, df in zip(transcript_ids, results):
+				yield t, df
+
+	rewriteStore(store_dir, transformShards(), outstore=outstore)
+
+def readIndex(store_dir):
+	'''
+	Reads the index of a store.
+
+	INPUT
+		store_dir : string, the store directory
+
+	RETURNS
+		pandas DataFrame, indexed by transcript ID, with the shard, byte offset
+			and byte length of each transcript record
+
+	'''
+	if not isStore(store_dir):
+		print "Could not find a transcript store at %s" % store_dir
+		exit(1)
+	index = pd.read_csv(os.path.join(store_dir, INDEX_NAME), dtype={'transcript_id': str})
+	return index.set_index('transcript_id', drop=False)
+
+def writeIndex(index, store_dir):
+	'''
+	Writes the index of a store. The index is written to a temporary file first
+	so that an interrupted write does not leave a truncated index behind.
+	'''
+	index_name = os.path.join(store_dir, INDEX_NAME)
+	index[INDEX_COLUMNS].to_csv('%s.tmp' % index_name, index=False)
+	os.rename('%s.tmp' % index_name, index_name)
+
+def readRecord(shard_file, offset, length):
+	'''
+	Reads a single transcript record from an open shard file.
+	'''
+	shard_file.seek(offset)
+	return pd.read_csv(StringIO(shard_file.read(length)))
+
+def readTranscript(store_dir, transcript_id, index=None):
+	'''
+	Reads the exon table for a single transcript in a store.
+
+	INPUT
+		store_dir : string, the store directory
+		transcript_id : string, ID of the transcript to read
+		index : pandas DataFrame, the store index. Read from *store_dir* if not given.
+
+	RETURNS
+		pandas DataFrame
+
+	'''
+	if index is None:
+		index = readIndex(store_dir)
+	if transcript_id not in index.index:
+		raise KeyError('transcript %s not found in store %s' % (transcript_id, store_dir))
+	shard, offset, length, generation = index.ix[transcript_id, ['shard', 'offset', 'length', 'generation']]
+	with open(shardPath(store_dir, int(shard), int(generation)), 'rb') as s:
+		return readRecord(s, int(offset), int(length))
+
+def iterTranscripts(store_dir, index=None):
+	'''
+	Iterates over all transcripts in a store. Records are visited in shard and
+	offset order, so each shard is read sequentially.
+
+	INPUT
+		store_dir : string, the store directory
+		index : pandas DataFrame, the store index. Read from *store_dir* if not given.
+
+	RETURNS
+		generator of (transcript_id, pandas DataFrame) pairs
+
+	'''
+	if index is None:
+		index = readIndex(store_dir)
+	index = index.sort_values(by=['shard', 'offset'])
+	for shard, shard_index in index.groupby('shard', sort=True):
+		with open(shardPath(store_dir, shard, int(shard_index['generation'].iloc[0])), 'rb') as s:
+			for transcript_id, offset, length in zip(shard_index['transcript_id'], shard_index['offset'], shard_index['length']):
+				yield transcript_id, readRecord(s, int(offset), int(length))
+
+def updateTranscript(store_dir, transcript_id, transcript_df, index=None, write_index=True):
+	'''
+	Replaces the exon table of a transcript in a store, or adds a new transcript.
+	The new record is appended to the transcript's shard.
+
+	INPUT
+		store_dir : string, the store directory
+		transcript_id : string, ID of the transcript to write
+		transcript_df : pandas DataFrame, the new exon table
+		index : pandas DataFrame, the store index. Read from *store_dir* if not given.
+		write_index : bool, whether to write the updated index to disk. Set to *False*
+			when updating many transcripts, then call *writeIndex* once.
+
+	RETURNS
+		pandas DataFrame, the updated index
+
+	'''
+	if index is None:
+		index = readIndex(store_dir)
+	generation = storeGeneration(store_dir, index=index)
+	if transcript_id in index.index:
+		shard = int(index.ix[transcript_id, 'shard'])
+	else:
+		shard = shardForTranscript(transcript_id, countShards(store_dir, index=index))
+	record = transcript_df.to_csv(index=False)
+	with open(shardPath(store_dir, shard, generation), 'ab') as s:
+		s.seek(0, os.SEEK_END)
+		offset = s.tell()
+		s.write(record)
+	index.loc[transcript_id] = [transcript_id, shard, offset, len(record), generation]
+	if write_index:
+		writeIndex(index, store_dir)
+	return index
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	if args.transcript:
+		print readTranscript(args.store, args.transcript).to_csv(index=False)
+	else:
+		for transcript_id in readIndex(args.store)['transcript_id']:
+			print transcript_id
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('store').parse_args())
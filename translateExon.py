@@ -3,12 +3,13 @@ translateExon.py -- translate exons with the appropriate phase information
 '''
 import math
 import os
-import argparse
+import itertools
 import numpy as np
 import pandas as pd
 from codonTable import codonTable
+import transcriptStore
 
-def translate(cds, startPhase, endPhase, find_orfs=True):
+def translate(cds, startPhase, endPhase, find_orfs=True, orf=None):
 	'''
 	Translate a nucleotide sequence into a protein sequence.
 
@@ -27,6 +28,9 @@ def translate(cds, startPhase, endPhase, find_orfs=True):
 			that lie on the previous exon)
 		endPhase : int, ending phase (number of nucleotides of last exon that
 			lie on the current exon).
+		orf : (start, stop, length) tuple, the precomputed longest ORF of *cds*
+			(see *annotateORFs*), used in place of *findORF* in case 3. A length
+			of 0 means *cds* has no ORF.
 
 	RETURNS
 		string, translated sequence
@@ -72,11 +76,11 @@ def translate(cds, startPhase, endPhase, find_orfs=True):
 		return result
 	else:
 		if find_orfs:
-			if findORF(cds):
-				start_pos, stop_pos, orf_length = findORF(cds)
-				#print cds[start_pos:stop_pos]
-				#print translate(cds[start_pos:stop_pos], startPhase=0, endPhase=0)
-				return translate(cds[start_pos:stop_pos], startPhase=0, endPhase=0)
+			if orf is None:
+				orf = findORF(cds)
+			if orf and orf[2]>0:
+				start_pos, stop_pos, orf_length = orf
+				return translate(cds[int(start_pos):int(stop_pos)], startPhase=0, endPhase=0)
 			else:
 				return ''
 		else:
@@ -122,6 +126,9 @@ def newFindStartExon(transcript_df, start_phase='startPhase', end_phase='endPhas
 		2. Exon has (start_phase, end_phase) = (>=0, x) and all previous exons are (-1, -1)
 		3. All exons are (-1, -1) and exon contains the longest ORF in the transcript
 
+	If *transcript_df* has an ``orf_length'' column from *annotateORFs*, the
+	precomputed ORF lengths are used for criterion 3.
+
 	INPUT
 		transcript_df : pandas DataFrame, with exons in rank order
 		start_phase, end_phase, rank : names of the columns in *transcript_df*
@@ -130,30 +137,43 @@ def newFindStartExon(transcript_df, start_phase='startPhase', end_phase='endPhas
 		int, the index of the start exon
 
 	'''
-	transcript_df = transcript_df.sort_values(by=rank)
-	transcript_df = transcript_df.set_index(rank, drop=False)
-	highest_rank = max(transcript_df.index)
+	columns = [rank, 'sequence', start_phase, end_phase] + (['orf_length'] if 'orf_length' in transcript_df.columns else [])
+	exons = sorted(zip(*[transcript_df[c].tolist() for c in columns]), key=lambda i: i[0])
+	columns = [list(i) for i in zip(*exons)]
+	return startExonRank(*columns)
+
+def startExonRank(ranks, sequences, start_phases, end_phases, orf_lengths=None):
+	'''
+	Finds the start exon of a transcript given as lists of exon attributes in
+	rank order, by the criteria of *newFindStartExon*.
+
+	INPUT
+		ranks, sequences, start_phases, end_phases : lists, one element for each exon
+		orf_lengths : list of int, the ORF lengths from *annotateORFs*. Found
+			with *findORF* if not given.
+
+	RETURNS
+		the rank of the start exon, or *False*
 
-	if transcript_df.ix[1,'startPhase']>=0:
+	'''
+	if dict(zip(ranks, start_phases))[1]>=0:
 		return 1
-	elif all([transcript_df['startPhase']<0][0]) and all([transcript_df['endPhase']<0][0]):
-		exon_orfs = [findORF(transcript_df.ix[i,'sequence']) for i in transcript_df.index]
-		for i in range(len(exon_orfs)):
-			if exon_orfs[i]==False:
-				exon_orfs[i]=(0,0,0)
-		if (not exon_orfs) or (not exon_orfs[0]) or (len(exon_orfs)==0):
-			return False
-		else:
-			return exon_orfs.index(max(exon_orfs, key=lambda i: i[2]))+1
+	elif all([p<0 for p in start_phases]) and all([q<0 for q in end_phases]):
+		if orf_lengths is None:
+			orf_lengths = [(findORF(i) or (0, 0, 0))[2] for i in sequences]
+		orf_lengths = [int(i) for i in orf_lengths]
+		return orf_lengths.index(max(orf_lengths))+1
 	else:
-		for i in transcript_df.index:
-			if (transcript_df.ix[i,'startPhase']<0) and (transcript_df.ix[i,'endPhase']>=0):
+		for i, p, q in zip(ranks, start_phases, end_phases):
+			if (p<0) and (q>=0):
 				return i
 		return False
 
-def newTranslateDF(transcript_df, start_phase='startPhase', end_phase='endPhase', rank='rank'):
+def newTranslateDF(transcript_df, start_phase='startPhase', end_phase='endPhase', rank='rank', verbose=True):
 	'''
-	Adds a new column, ``protein'', to the DataFrame *transcript_df*.
+	Adds a new column, ``protein'', to the DataFrame *transcript_df*. Uses the
+	``orf_peptide'' column from *annotateORFs* and the ``exon_peptide'' column
+	from *translateNormalized* if they are present.
 
 	INPUT
 		transcript_df : pandas DataFrame, indices are exons corresponding to that transcript. Must
@@ -161,66 +181,204 @@ def newTranslateDF(transcript_df, start_phase='startPhase', end_phase='endPhase'
 
 		start_phase, end_phase, rank : strings, names of the corresponding columns in *transcript_df*
 
+		verbose : bool, print the transcript and its start exon
+
 	RETURNS
 		pandas DataFrame, a copy of *transcript_df* with the new ``protein'' column
 
 	'''
-	print transcript_df
+	if verbose:
+		print transcript_df
 	start_exon = newFindStartExon(transcript_df, start_phase=start_phase, end_phase=end_phase, rank=rank)
 	if not start_exon:
 		peptides = pd.Series(['' for i in transcript_df.index])
 		transcript_df['protein']=peptides
 		return transcript_df
-	peptides = pd.Series([])
-	for i in transcript_df.index:
-		if i < start_exon:
-			peptides.ix[i]=''
-		elif i==start_exon:
-			peptides.ix[i]=translate(transcript_df.ix[i,'sequence'], transcript_df.ix[i,start_phase], transcript_df.ix[i,end_phase])
-		else:
-			peptide = translate(transcript_df.ix[i,'sequence'], transcript_df.ix[i,start_phase], transcript_df.ix[i,end_phase])
-			if i>1: #get the first codon, part of which lies on the previous exon
-				if transcript_df.ix[i,start_phase]>0:
-					_start_phase = int(transcript_df.ix[i,start_phase])
-					prev_cds = transcript_df.ix[i-1,'sequence']
-					first_codon=prev_cds[-_start_phase:]
-					first_codon = first_codon + transcript_df.ix[i,'sequence'][:(3-_start_phase)]
-					peptide = codonTable[first_codon] + peptide
-				else:
-					pass
-			peptides.ix[i]=peptide
-	transcript_df['protein']=peptides
-	print "START EXON: %d\n\n" % start_exon ##debugging
+	sequences = transcript_df['sequence'].tolist()
+	start_phases = transcript_df[start_phase].tolist()
+	end_phases = transcript_df[end_phase].tolist()
+	exon_peptides = transcript_df['exon_peptide'].tolist() if 'exon_peptide' in transcript_df.columns else None
+	orf_peptides = transcript_df['orf_peptide'].tolist() if 'orf_peptide' in transcript_df.columns else None
+	def peptide(k):
+		return exonPeptide(sequences[k], start_phases[k], end_phases[k], exon_peptide=exon_peptides[k] if exon_peptides else None, \
+			orf_peptide=orf_peptides[k] if orf_peptides else None)
+	transcript_df['protein'] = assemblePeptides(transcript_df.index.tolist(), sequences, start_phases, start_exon, peptide)
+	if verbose:
+		print "START EXON: %d\n\n" % start_exon ##debugging
 	return transcript_df
 
-def translateTranscriptFile(transcriptFile, rank='rank', start_phase='startPhase', end_phase='endPhase'):
+def assemblePeptides(ranks, sequences, start_phases, start_exon, exon_peptide):
+	'''
+	Builds the peptides of the exons of a transcript from their own peptides,
+	adding to each exon the codon that it shares with the previous exon. Exons
+	before the start exon get an empty peptide.
+
+	INPUT
+		ranks, sequences, start_phases : lists, one element for each exon
+		start_exon : the rank of the start exon, from *startExonRank*
+		exon_peptide : function taking the position of an exon in the lists and
+			returning its own peptide. Only called for the start exon and after.
+
+	RETURNS
+		list of string
+
+	'''
+	positions = dict(zip(ranks, range(len(ranks))))
+	peptides = []
+	for k, i in enumerate(ranks):
+		if i < start_exon:
+			peptides.append('')
+			continue
+		peptide = exon_peptide(k)
+		if i!=start_exon and i>1 and start_phases[k]>0: #get the first codon, part of which lies on the previous exon
+			_start_phase = int(start_phases[k])
+			first_codon = sequences[positions[i-1]][-_start_phase:] + sequences[k][:(3-_start_phase)]
+			peptide = codonTable[first_codon] + peptide
+		peptides.append(peptide)
+	return peptides
+
+def exonPeptide(sequence, start_phase, end_phase, exon_peptide=None, orf_peptide=None):
+	'''
+	Translates an exon on its own, without the codon it shares with the
+	previous exon. Uses *exon_peptide*, the peptide from *translateNormalized*,
+	if it is given, and for a noncoding exon *orf_peptide*, the peptide of its
+	longest ORF from *annotateORFs*, if it is given.
+	'''
+	if exon_peptide is not None:
+		return exon_peptide if type(exon_peptide)==type('') else ''
+	if orf_peptide is not None and start_phase<0 and end_phase<0:
+		return orf_peptide if type(orf_peptide)==type('') else ''
+	return translate(sequence, start_phase, end_phase)
+
+def translateTranscriptFile(transcriptFile, rank='rank', start_phase='startPhase', end_phase='endPhase', store=None, index=None):
 	'''
 	Reads a file containing exon sequences corresponding to one transcript and
 	translates each of the exons, adding a ``protein'' column to the file.
 
 	INPUT
-		transcriptFile : Pandas-type CSV with the exon sequences to be translated
+		transcriptFile : Pandas-type CSV with the exon sequences to be translated,
+			or a transcript ID if *store* is given
+
+		store : string, name of a transcript store directory containing the
+			transcript *transcriptFile*. The translated transcript is written
+			back to the store.
+
+		index : pandas DataFrame, the index of *store*, to avoid rereading it
+			for every transcript
 
 	RETURNS
 		<None> (writes to file)
 
 	'''
-	f = pd.read_csv(transcriptFile)
-	f = f.sort_values(by=rank)
-	f = f.drop_duplicates('rank')
+	if store:
+		f = transcriptStore.readTranscript(store, transcriptFile, index=index)
+	else:
+		f = pd.read_csv(transcriptFile)
+	f = translateTranscriptDF(f, rank=rank, start_phase=start_phase, end_phase=end_phase)
+	if store:
+		transcriptStore.updateTranscript(store, transcriptFile, f, index=index)
+	else:
+		f.to_csv(transcriptFile, index=False)
+
+def translateTranscriptDF(f, rank='rank', start_phase='startPhase', end_phase='endPhase', verbose=True):
+	'''
+	Sorts, deduplicates and translates the exons of a single transcript as read
+	from a transcript file. *verbose* is passed to *newTranslateDF*.
+
+	RETURNS
+		pandas DataFrame, with the new ``protein'' column
+
+	'''
+	ranks = f[rank].tolist()
+	if rank!='rank' or not all([a < b for a, b in zip(ranks, ranks[1:])]):
+		f = f.sort_values(by=rank)
+		f = f.drop_duplicates('rank')
 	f = f.set_index(rank, drop=False)
-	f = newTranslateDF(f, rank=rank, start_phase=start_phase, end_phase=end_phase)
-	f.to_csv(transcriptFile, index=False)
+	return newTranslateDF(f, rank=rank, start_phase=start_phase, end_phase=end_phase, verbose=verbose)
 
-if __name__=='__main__':
-	parser = argparse.ArgumentParser(description='given a CSV with exon sequences, translate them with the correct phase')
-	parser.add_argument('infile', type=str, help='file or directory of files with exons corresponding to a single transcript')
-	parser.add_argument('--startphase', type=str, help="name of the start phase column. default: ``startPhase''.", default='startPhase')
-	parser.add_argument('--endphase', type=str, help="name of the end phase column. default: ``endPhase''.", default='endPhase')
-	parser.add_argument('--rank', type=str, help="name of the rank column. default: ``rank''.", default='rank')
-
-	args = parser.parse_args()
-	if os.path.isdir(args.infile):
+def translateExonTable(df, transcript_column='transcript_id', rank='rank', start_phase='startPhase', end_phase='endPhase'):
+	'''
+	Translates the exons of many transcripts in one table, giving the same
+	proteins as *translateTranscriptDF* on each transcript. The columns are read
+	into lists once for the whole table, so no DataFrame is built or indexed for
+	each transcript. Uses the ``orf_length'' and ``orf_peptide'' columns from
+	*annotateORFs* and the ``exon_peptide'' column from *translateNormalized* if
+	they are present.
+
+	INPUT
+		df : pandas DataFrame, with one exon of a transcript per index
+		transcript_column, rank, start_phase, end_phase : names of the
+			corresponding columns in *df*
+
+	RETURNS
+		pandas DataFrame, a copy of *df* with the new ``protein'' column, in the
+			same order. Rows repeating the rank of an earlier row of the same
+			transcript are not translated.
+
+	'''
+	transcripts, ranks, sequences, start_phases, end_phases = [df[c].tolist() for c in [transcript_column, rank, 'sequence', start_phase, end_phase]]
+	orf_lengths, orf_peptides, exon_peptides = [df[c].tolist() if c in df.columns else None for c in ['orf_length', 'orf_peptide', 'exon_peptide']]
+	proteins = [None for i in ranks]
+	order = sorted(range(len(ranks)), key=lambda k: (transcripts[k], ranks[k]))
+	for transcript, rows in itertools.groupby(order, key=lambda k: transcripts[k]):
+		seen = set()
+		rows = [k for k in rows if not (ranks[k] in seen or seen.add(ranks[k]))]
+		exon_ranks = [ranks[k] for k in rows]
+		exon_sequences = [sequences[k] for k in rows]
+		exon_start_phases = [start_phases[k] for k in rows]
+		start_exon = startExonRank(exon_ranks, exon_sequences, exon_start_phases, [end_phases[k] for k in rows], \
+			orf_lengths=[orf_lengths[k] for k in rows] if orf_lengths else None)
+		if not start_exon:
+			peptides = ['' for k in rows]
+		else:
+			peptides = assemblePeptides(exon_ranks, exon_sequences, exon_start_phases, start_exon, lambda j: \
+				exonPeptide(sequences[rows[j]], start_phases[rows[j]], end_phases[rows[j]], \
+					exon_peptide=exon_peptides[rows[j]] if exon_peptides else None, orf_peptide=orf_peptides[rows[j]] if orf_peptides else None))
+		for k, peptide in zip(rows, peptides):
+			proteins[k] = peptide
+	df = df.copy()
+	df['protein'] = proteins
+	return df
+
+def translateStore(store, outstore=None, rank='rank', start_phase='startPhase', end_phase='endPhase'):
+	'''
+	Translates every transcript in a transcript store in a single sequential
+	pass, writing the results to a new store. Transcripts that cannot be
+	translated are reported and written unchanged.
+
+	INPUT
+		store : string, the transcript store directory
+		outstore : string, the store directory to write to. If not given, *store*
+			is replaced with the translated store.
+
+	RETURNS
+		list of string, the IDs of the transcripts that could not be translated
+
+	'''
+	failed = []
+	def translated():
+		for t, df in transcriptStore.iterTranscripts(store):
+			try:
+				df = translateTranscriptDF(df, rank=rank, start_phase=start_phase, end_phase=end_phase)
+			except Exception as e:
+				print "Could not translate transcript %s: %r" % (t, e)
+				failed.append(t)
+			yield t, df
+	transcriptStore.rewriteStore(store, translated(), outstore=outstore)
+	if failed:
+		print "%d transcripts could not be translated and were left untranslated" % len(failed)
+	return failed
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	if transcriptStore.isStore(args.infile):
+		if args.transcript:
+			translateTranscriptFile(args.transcript, rank=args.rank, start_phase=args.startphase, end_phase=args.endphase, store=args.infile)
+		else:
+			translateStore(args.infile, outstore=args.outstore, rank=args.rank, start_phase=args.startphase, end_phase=args.endphase)
+	elif os.path.isdir(args.infile):
 		files = [i for i in os.listdir(args.infile) if '.csv' in i]
 		for u in files:
 			try:
@@ -229,3 +387,7 @@ if __name__=='__main__':
 				continue
 	else:
 		translateTranscriptFile(args.infile, rank=args.rank, start_phase=args.startphase, end_phase=args.endphase)
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('translate').parse_args())
@@ -0,0 +1,76 @@
+'''
+translateNormalized.py -- translate the normalized exon tables written by
+``segmentTranscripts.py --normalize``.
+
+Each unique exon is translated once, on its own, into an ``exon_peptide''
+column of the exon table; noncoding exons have their ORFs found in one pass
+with *annotateORFs*. The exon peptides are then joined onto the transcript
+exon table, and all transcripts are assembled in one pass with
+*translateExon.translateExonTable*, which only has to choose the start exon and
+add the codons shared between exons. The resulting ``protein'' column is
+written to the transcript exon table.
+'''
+import pandas as pd
+from translateExon import exonPeptide, translateExonTable
+from annotateORFs import annotateORFs
+from segmentTranscripts import denormalizeExons
+
+def translateNormalized(exons, mapping, transcript_column='transcript_id', exon_column='exon_id', rank='rank', start_phase='startPhase', end_phase='endPhase'):
+	'''
+	Translates a set of transcripts given as a table of unique exons and a
+	table of transcript exons.
+
+	INPUT
+		exons : pandas DataFrame, one row for each unique exon, with sequence
+			and phase information
+		mapping : pandas DataFrame, relating each transcript and rank to an exon
+		transcript_column, exon_column, rank, start_phase, end_phase : names of
+			the corresponding columns
+
+	RETURNS
+		(exons, mapping) : pandas DataFrames. *exons* has the new ORF and
+			``exon_peptide'' columns, and *mapping* has the new ``protein'' column.
+
+	'''
+	if exon_column not in mapping.columns:
+		exon_column = 'exon_key'
+	exons = annotateORFs(exons, start_phase=start_phase, end_phase=end_phase, frame_peptides=False)
+	exons['exon_peptide'] = [exonPeptide(s, p, q, orf_peptide=o) for s, p, q, o in \
+		zip(exons['sequence'].tolist(), exons[start_phase].tolist(), exons[end_phase].tolist(), exons['orf_peptide'].tolist())]
+
+	transcript_exons = denormalizeExons(exons, mapping, exon_column=exon_column, start_phase=start_phase, end_phase=end_phase)
+	proteins = translateExonTable(transcript_exons, transcript_column=transcript_column, rank=rank, start_phase=start_phase, end_phase=end_phase)
+	proteins = proteins[[transcript_column, rank, 'protein']].drop_duplicates([transcript_column, rank])
+	mapping = mapping.drop('protein', axis=1) if 'protein' in mapping.columns else mapping
+	mapping = mapping.merge(proteins, on=[transcript_column, rank], how='left')
+	return exons, mapping
+
+def translateNormalizedFiles(exon_file, mapping_file, transcript_column='transcript_id', exon_column='exon_id', rank='rank', start_phase='startPhase', end_phase='endPhase'):
+	'''
+	Reads the tables written by ``segmentTranscripts.py --normalize``, translates
+	them with *translateNormalized* and writes them back.
+
+	INPUT
+		exon_file : string, CSV of unique exons
+		mapping_file : string, CSV of transcript exons
+
+	RETURNS
+		<None> (writes to file)
+
+	'''
+	exons, mapping = translateNormalized(pd.read_csv(exon_file), pd.read_csv(mapping_file, dtype={transcript_column: str}), \
+		transcript_column=transcript_column, exon_column=exon_column, rank=rank, start_phase=start_phase, end_phase=end_phase)
+	exons.to_csv(exon_file, index=False)
+	mapping.to_csv(mapping_file, index=False)
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	translateNormalizedFiles(args.exonfile, args.mappingfile, transcript_column=args.column, exon_column=args.exoncolumn, rank=args.rank, \
+		start_phase=args.startphase, end_phase=args.endphase)
+	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('translatenormalized').parse_args())
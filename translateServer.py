@@ -0,0 +1,304 @@
+'''
+translateServer.py -- a long-lived local HTTP server that answers translation
+requests, so that interactive lookups do not pay the startup cost of
+*translateExon* and *printFullProtein* each time.
+
+The server keeps the codon tables, the index of a transcript store (or the
+name of a directory of transcript CSVs) and a cache of translated transcripts
+in memory. The index is read again, and the cache emptied, whenever the index
+file of the store changes. Requests that arrive at the same time are collected into a batch and
+processed together; in particular, the ORFs of all noncoding raw sequences in a
+batch are found in one pass with *annotateORFs*.
+
+Requests are JSON objects, or lists of JSON objects, POSTed to one of:
+
+	/translate : translate a raw sequence,
+			{"sequence": "ATG...", "startPhase": 0, "endPhase": 0}
+		returning {"protein": "M..."}, or translate each exon of a transcript,
+			{"transcript": "ENST..."}
+		returning {"transcript": "ENST...", "exons": [{"rank": 1, "protein": "M..."}, ...]}
+
+	/protein : the full protein of a transcript,
+			{"transcript": "ENST..."}
+		returning {"transcript": "ENST...", "protein": "M..."}
+
+Failed requests return {"error": "..."}. For example:
+
+	python translateServer.py -s transcript_store -p 8765 &
+	curl -d '{"transcript": "ENST00000367429"}' localhost:8765/protein
+'''
+import os
+import json
+import time
+import threading
+import Queue
+import BaseHTTPServer
+import SocketServer
+from collections import OrderedDict
+import pandas as pd
+from translateExon import exonPeptide, translateTranscriptDF
+from annotateORFs import annotateORFs
+from printFullProtein import fullProtein
+import transcriptStore
+
+class TranscriptSource(object):
+	'''
+	Reads and translates transcripts from a transcript store or a directory of
+	transcript CSVs, keeping the most recently used translations in memory.
+	'''
+	def __init__(self, store=None, directory=None, cache_size=10000):
+		self.store = store
+		self.directory = directory
+		self.index = None
+		self.index_mtime = None
+		self.cache_size = cache_size
+		self.cache = OrderedDict()
+		self.refreshIndex()
+
+	def refreshIndex(self):
+		'''
+		Reads the store index again if it has been modified since it was last
+		read, as when the store has been rewritten or a transcript updated, and
+		empties the cache, which may hold transcripts from the old store.
+		'''
+		if not self.store:
+			return
+		mtime = os.path.getmtime(os.path.join(self.store, transcriptStore.INDEX_NAME))
+		if mtime != self.index_mtime:
+			self.index = transcriptStore.readIndex(self.store)
+			self.index_mtime = mtime
+			self.cache.clear()
+
+	def getTranscripts(self, transcript_ids):
+		'''
+		Returns a dict relating each transcript ID in *transcript_ids* to its
+		translated exon table, or to the error raised when reading it.
+		'''
+		self.refreshIndex()
+		result = {}
+		missing = []
+		for t in set(transcript_ids):
+			if t in self.cache:
+				result[t] = self.cache.pop(t)
+				self.cache[t] = result[t]
+			else:
+				missing.append(t)
+		if self.index is not None:
+			#read store records in shard and offset order
+			missing = sorted(missing, key=lambda t: tuple(self.index.ix[t, ['shard', 'offset']]) if t in self.index.index else (-1, -1))
+		for t in missing:
+			try:
+				result[t] = self.readTranscript(t)
+			except Exception as e:
+				#a malformed transcript only fails the requests for it
+				result[t] = e
+				continue
+			self.cache[t] = result[t]
+			if len(self.cache) > self.cache_size:
+				self.cache.popitem(last=False)
+		return result
+
+	def readTranscript(self, transcript_id):
+		#transcript IDs are used in file names, so must not name another directory
+		if '/' in transcript_id or '..' in transcript_id:
+			raise ValueError('invalid transcript ID %s' % transcript_id)
+		if self.store:
+			df = transcriptStore.readTranscript(self.store, transcript_id, index=self.index)
+		elif self.directory:
+			df = pd.read_csv('%s/%s.csv' % (self.directory, transcript_id))
+		else:
+			raise KeyError('no transcript store or directory was given to the server')
+		if 'protein' not in df.columns:
+			df = translateTranscriptDF(df, verbose=False)
+		return df
+
+validBases = 'ACGTUN'
+
+def parseSequenceRequest(request):
+	'''
+	Validates a raw sequence request.
+
+	RETURNS
+		(sequence, startPhase, endPhase)
+
+	'''
+	sequence = str(request['sequence']).upper()
+	if sequence.translate(None, validBases):
+		raise ValueError('sequence contains characters other than %s' % validBases)
+	phases = (int(request.get('startPhase', 0)), int(request.get('endPhase', 0)))
+	if not all(-1 <= p <= 2 for p in phases):
+		raise ValueError('phases must be between -1 and 2')
+	return (sequence,) + phases
+
+def translateSequences(requests):
+	'''
+	Translates a batch of raw sequence requests. Each request is validated and
+	translated on its own, so that an invalid request only fails itself, but the
+	longest ORFs of all valid noncoding sequences are found together. Coding
+	sequences do not need ORFs and are translated directly.
+
+	RETURNS
+		list of dict, the responses
+
+	'''
+	responses = [None for r in requests]
+	valid = []
+	for i, r in enumerate(requests):
+		try:
+			valid.append((i,) + parseSequenceRequest(r))
+		except (KeyError, ValueError, TypeError) as e:
+			responses[i] = {'error': 'could not translate sequence: %s' % e}
+	noncoding = [v for v in valid if v[2]<0 and v[3]<0]
+	orf_peptides = {}
+	if noncoding:
+		df = annotateORFs(pd.DataFrame(dict(zip(['request', 'sequence', 'startPhase', 'endPhase'], zip(*noncoding))),
+			columns=['request', 'sequence', 'startPhase', 'endPhase']), frame_peptides=False)
+		orf_peptides = dict(zip(df['request'].tolist(), df['orf_peptide'].tolist()))
+	for request, sequence, start_phase, end_phase in valid:
+		try:
+			responses[request] = {'protein': exonPeptide(sequence, start_phase, end_phase, orf_peptide=orf_peptides.get(request))}
+		except Exception as e:
+			responses[request] = {'error': 'could not translate sequence: %s' % e}
+	return responses
+
+def transcriptResponse(path, transcript_id, df):
+	'''
+	Builds the response to a transcript request from its translated exon table.
+	'''
+	if isinstance(df, Exception):
+		return {'transcript': transcript_id, 'error': str(df)}
+	elif path=='/protein':
+		return {'transcript': transcript_id, 'protein': fullProtein(df)}
+	else:
+		return {'transcript': transcript_id, 'exons': [{'rank': int(rank), 'protein': p if type(p)==type('') else ''} \
+			for rank, p in zip(df['rank'], df['protein'])]}
+
+def processBatch(batch, source):
+	'''
+	Answers a batch of (path, request) pairs. Errors are caught for each
+	request separately.
+
+	RETURNS
+		list of dict, the responses in the order of *batch*
+
+	'''
+	responses = [None for i in batch]
+	sequence_requests = [i for i, (path, r) in enumerate(batch) if path=='/translate' and 'sequence' in r]
+	for i, response in zip(sequence_requests, translateSequences([batch[i][1] for i in sequence_requests])):
+		responses[i] = response
+
+	transcript_requests = [i for i, (path, r) in enumerate(batch) if responses[i] is None and 'transcript' in r]
+	transcripts = source.getTranscripts([unicode(batch[i][1]['transcript']).encode('utf-8') for i in transcript_requests])
+	for i in transcript_requests:
+		path, r = batch[i]
+		t = unicode(r['transcript']).encode('utf-8')
+		try:
+			responses[i] = transcriptResponse(path, t, transcripts[t])
+		except Exception as e:
+			responses[i] = {'transcript': t, 'error': 'could not translate transcript: %s' % e}
+
+	for i in range(len(batch)):
+		if responses[i] is None:
+			responses[i] = {'error': 'unrecognized request %r to %s' % (batch[i][1], batch[i][0])}
+	return responses
+
+class Batcher(object):
+	'''
+	Collects requests from the handler threads and answers them in batches on
+	a single worker thread. A batch contains every request that arrives within
+	*batch_window* seconds of the first, up to *max_batch* requests.
+	'''
+	def __init__(self, source, batch_window=0.005, max_batch=1000):
+		self.source = source
+		self.batch_window = batch_window
+		self.max_batch = max_batch
+		self.queue = Queue.Queue()
+		worker = threading.Thread(target=self.run)
+		worker.daemon = True
+		worker.start()
+
+	def submit(self, path, requests):
+		'''
+		Submits a list of requests to *path* and waits for their responses.
+		'''
+		pending = [{'done': threading.Event()} for r in requests]
+		for r, p in zip(requests, pending):
+			self.queue.put((path, r, p))
+		for p in pending:
+			p['done'].wait()
+		return [p['response'] for p in pending]
+
+	def run(self):
+		while True:
+			items = [self.queue.get()]
+			deadline = time.time() + self.batch_window
+			while len(items) < self.max_batch:
+				try:
+					items.append(self.queue.get(timeout=max(deadline-time.time(), 0)))
+				except Queue.Empty:
+					break
+			try:
+				responses = processBatch([(path, r) for path, r, p in items], self.source)
+			except Exception as e:
+				responses = [{'error': 'internal error: %s' % e} for i in items]
+			for (path, r, p), response in zip(items, responses):
+				p['response'] = response
+				p['done'].set()
+
+class TranslateHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_POST(self):
+		try:
+			body = json.loads(self.rfile.read(int(self.headers.getheader('content-length', 0))))
+		except ValueError:
+			self.sendJSON(400, {'error': 'request body is not valid JSON'})
+			return
+		requests = body if isinstance(body, list) else [body]
+		if not all(isinstance(r, dict) for r in requests):
+			self.sendJSON(400, {'error': 'requests must be JSON objects'})
+			return
+		responses = self.server.batcher.submit(self.path, requests)
+		self.sendJSON(200, responses if isinstance(body, list) else responses[0])
+
+	def sendJSON(self, code, obj):
+		out = json.dumps(obj)
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(out)))
+		self.end_headers()
+		self.wfile.write(out)
+
+	def log_message(self, format, *args):
+		pass
+
+class TranslateServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+def serve(port=8765, store=None, directory=None, cache_size=10000, batch_window=0.005):
+	'''
+	Runs the translation server on localhost until interrupted.
+
+	INPUT
+		port : int, port to listen on
+		store : string, transcript store directory to read transcripts from
+		directory : string, directory of transcript CSVs named <transcript ID>.csv
+		cache_size : int, number of translated transcripts to keep in memory
+		batch_window : float, seconds to wait for more requests to batch together
+
+	'''
+	server = TranslateServer(('127.0.0.1', port), TranslateHandler)
+	server.batcher = Batcher(TranscriptSource(store=store, directory=directory, cache_size=cache_size), batch_window=batch_window)
+	print "Serving translations on localhost:%d" % port
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		server.server_close()
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	serve(port=args.port, store=args.store, directory=args.directory, cache_size=args.cachesize, batch_window=args.window)
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('serve').parse_args())
@@ -0,0 +1,293 @@
+'''
+verifyTranslation.py -- check that the optimized translation paths give the
+same proteins as the reference per-row implementation, and measure the
+throughput of each path.
+
+A synthetic corpus of transcripts is generated from a random seed. Transcripts
+are built from untranslated exons (-1, -1), a start exon (-1, x) or (0, x),
+chains of coding exons whose start phase is the end phase of the previous exon,
+and a stop exon (x, -1), so that every combination of start and end phase
+appears. A fraction of the transcripts contain only noncoding exons, which are
+translated from their longest ORF. Another fraction are followed by an isoform
+that reuses their exons, either at shifted ranks or with all phases -1 as in a
+noncoding isoform, so that the normalized path has shared exons to deduplicate
+and exons whose phases differ between transcripts.
+
+The following paths are compared against the reference:
+	transcripts : *translateExon.translateExonTable* on the whole corpus, with
+		the ORFs precomputed by *annotateORFs*, against *newTranslateDF* on
+		each transcript, searching each exon with *findORF*
+	normalized : *translateNormalized* on the unique exon and transcript exon
+		tables from *segmentTranscripts.normalizeExons*, against the same
+		reference as ``transcripts''
+	sequences : the batched raw-sequence translation of *translateServer*,
+		against *translateExon.translate* on each exon
+
+The throughput of each path in exons per second is printed, along with the
+speedup of the optimized path over the reference. As both run on the same
+machine, the speedup is checked against *minimumSpeedups* on every run, while
+the absolute throughputs can be saved to and compared against a baseline file
+for one machine. The program exits with status 1 if any protein differs from
+the reference, if the corpus lacks any of *expectedCombinations*, if any
+speedup is below its minimum, or if any throughput falls below the baseline by
+more than the tolerance. The proteins of the reference path can also be saved
+as a golden output file, and later runs checked against it.
+'''
+import os
+import json
+import time
+import random
+import itertools
+import pandas as pd
+from translateExon import translate, translateTranscriptDF, translateExonTable
+from annotateORFs import annotateORFs
+from translateServer import translateSequences
+from segmentTranscripts import normalizeExons
+from translateNormalized import translateNormalized
+
+# The (startPhase, endPhase) combinations that the corpus must contain:
+# untranslated exons, start exons, coding exons and stop exons. Start exons
+# (0, x) are among the coding exons.
+expectedCombinations = set([(-1, -1)] + [(-1, q) for q in range(3)] + \
+	[(p, q) for p in range(3) for q in range(3)] + [(p, -1) for p in range(3)])
+
+# The minimum ratio of optimized to reference throughput for each path. The
+# ratio does not depend on the speed of the machine, so it is checked on every
+# run. With the default corpus, Python 2.7 and numpy 1.16, the measured ratios
+# were 11-12 (transcripts), 5.7-9.1 (normalized) and 1.5-2.0 (sequences) with
+# pandas 0.20.3, and 11-16, 7.7-8.6 and 1.9-2.7 with pandas 0.23.4.
+minimumSpeedups = {'transcripts': 4.0, 'normalized': 2.5, 'sequences': 1.2}
+
+def randomSequence(rng, length):
+	'''
+	A random nucleotide sequence, with extra start codons so that the
+	noncoding exons have ORFs to find.
+	'''
+	seq = [rng.choice('ACGT') for i in range(length)]
+	for i in range(length/30):
+		pos = rng.randint(0, max(length-3, 0))
+		seq[pos:pos+3] = 'ATG'
+	return ''.join(seq)[:length]
+
+corpusColumns = ['transcript_id', 'rank', 'exon_id', 'startPhase', 'endPhase', 'sequence']
+
+def syntheticTranscript(rng, transcript_id, noncoding_fraction=0.2):
+	'''
+	Generates the exons of one synthetic transcript.
+
+	RETURNS
+		pandas DataFrame with ``transcript_id'', ``rank'', ``exon_id'',
+			``startPhase'', ``endPhase'' and ``sequence'' columns
+
+	'''
+	phases = []
+	if rng.random() < noncoding_fraction:
+		phases = [(-1, -1) for i in range(rng.randint(1, 6))]
+	else:
+		phases += [(-1, -1) for i in range(rng.randint(0, 2))]
+		end_phase = rng.randint(0, 2)
+		if phases or rng.random() < 0.5:
+			phases.append((-1, end_phase))
+		else:
+			phases.append((0, end_phase))
+		for i in range(rng.randint(0, 8)):
+			start_phase, end_phase = end_phase, rng.randint(0, 2)
+			phases.append((start_phase, end_phase))
+		if rng.random() < 0.8:
+			phases.append((end_phase, -1))
+			phases += [(-1, -1) for i in range(rng.randint(0, 2))]
+	sequences = [randomSequence(rng, rng.randint(20, 400)) for p in phases]
+	return pd.DataFrame({'transcript_id': transcript_id, 'rank': range(1, len(phases)+1),
+		'exon_id': ['%s.%d' % (transcript_id, i) for i in range(1, len(phases)+1)],
+		'startPhase': [p[0] for p in phases], 'endPhase': [p[1] for p in phases], 'sequence': sequences},
+		columns=corpusColumns)
+
+def syntheticIsoform(rng, transcript_df, transcript_id):
+	'''
+	Generates an isoform of a synthetic transcript that shares its exons: with
+	a new untranslated first exon or without its first exon, so that the shared
+	exons have different ranks in the two transcripts, or with the same exons
+	untranslated, so that they have different phases.
+	'''
+	isoform = transcript_df.copy()
+	choice = rng.random()
+	if choice < 0.3:
+		isoform['startPhase'] = -1
+		isoform['endPhase'] = -1
+	elif len(isoform)>1 and choice < 0.65:
+		isoform = isoform.iloc[1:]
+	else:
+		first = pd.DataFrame({'exon_id': ['%s.0' % transcript_id], 'startPhase': [-1], 'endPhase': [-1],
+			'sequence': [randomSequence(rng, rng.randint(20, 400))]})
+		isoform = pd.concat([first, isoform], ignore_index=True)
+	isoform = isoform.reset_index(drop=True)
+	isoform['transcript_id'] = transcript_id
+	isoform['rank'] = range(1, len(isoform)+1)
+	return isoform[corpusColumns]
+
+def syntheticCorpus(n_transcripts, seed=0, noncoding_fraction=0.2, isoform_fraction=0.3):
+	'''
+	Generates a corpus of synthetic transcripts. A fraction *isoform_fraction*
+	of the transcripts are isoforms sharing the exons of the previous transcript.
+
+	RETURNS
+		list of pandas DataFrame, one for each transcript
+
+	'''
+	rng = random.Random(seed)
+	corpus = []
+	while len(corpus) < n_transcripts:
+		transcript_id = 'T%07d' % len(corpus)
+		if corpus and rng.random() < isoform_fraction:
+			corpus.append(syntheticIsoform(rng, corpus[-1], transcript_id))
+		else:
+			corpus.append(syntheticTranscript(rng, transcript_id, noncoding_fraction=noncoding_fraction))
+	return corpus
+
+def peptides(df):
+	'''
+	The per-exon proteins of a translated transcript as a list of strings.
+	'''
+	return [p if type(p)==type('') else '' for p in df['protein']]
+
+def corpusTable(corpus):
+	'''
+	The exons of all transcripts in the corpus as one table, as read from a CSV
+	or a store shard by the optimized paths. Built from column lists, as
+	*pd.concat* of thousands of small tables is slow.
+	'''
+	return pd.DataFrame(dict([(c, list(itertools.chain(*[df[c].tolist() for df in corpus]))) for c in corpusColumns]), columns=corpusColumns)
+
+def referenceTranscripts(corpus, table):
+	return [peptides(translateTranscriptDF(df.copy(), verbose=False)) for df in corpus]
+
+def optimizedTranscripts(corpus, table):
+	proteins = peptides(translateExonTable(annotateORFs(table, frame_peptides=False)))
+	bounds = [0]
+	for df in corpus:
+		bounds.append(bounds[-1] + len(df))
+	return [proteins[bounds[i]:bounds[i+1]] for i in range(len(corpus))]
+
+def optimizedNormalized(corpus, table):
+	exons, mapping = normalizeExons(table)
+	if not len(exons) < len(mapping):
+		raise AssertionError('no shared exons were found: %d unique exons in %d transcript exons' % (len(exons), len(mapping)))
+	exons, mapping = translateNormalized(exons, mapping)
+	#the mapping table is sorted by transcript and rank
+	proteins = dict([(t, [p for t, p in rows]) for t, rows in itertools.groupby(zip(mapping['transcript_id'].tolist(), peptides(mapping)), key=lambda i: i[0])])
+	return [proteins[df['transcript_id'].iloc[0]] for df in corpus]
+
+def referenceSequences(corpus, table):
+	return [translate(s, p, q) for s, p, q in zip(table['sequence'].tolist(), table['startPhase'].tolist(), table['endPhase'].tolist())]
+
+def optimizedSequences(corpus, table):
+	requests = [{'sequence': s, 'startPhase': p, 'endPhase': q} for s, p, q in zip(table['sequence'].tolist(), table['startPhase'].tolist(), table['endPhase'].tolist())]
+	return [r['protein'] for r in translateSequences(requests)]
+
+# name : (reference, optimized). Each is a function of the corpus, as a list of
+# transcript tables, and of the same exons as one table from *corpusTable*.
+paths = {'transcripts': (referenceTranscripts, optimizedTranscripts),
+	'normalized': (referenceTranscripts, optimizedNormalized),
+	'sequences': (referenceSequences, optimizedSequences)}
+
+def timed(function, corpus, table):
+	start = time.time()
+	result = function(corpus, table)
+	return result, time.time() - start
+
+def verifyTranslation(n_transcripts=2000, seed=0, baseline=None, record=False, tolerance=0.3, golden=None, minimum_speedup=None):
+	'''
+	Runs the reference and optimized paths on a synthetic corpus, checks that
+	their proteins are identical, and checks their throughput against a baseline.
+
+	INPUT
+		n_transcripts : int, number of synthetic transcripts
+		seed : int, random seed for the corpus
+		baseline : string, JSON file of exons per second for each path
+		record : bool, write the measured throughputs to *baseline* rather
+			than checking against it
+		tolerance : float, fraction by which a throughput may fall below the
+			baseline before failing
+		golden : string, JSON file of reference proteins. Written if it does not
+			exist, otherwise the reference proteins are checked against it.
+		minimum_speedup : float, minimum ratio of optimized to reference
+			throughput for every path. Default: the ratios in *minimumSpeedups*.
+
+	RETURNS
+		list of string, the failures. Empty if all checks pass.
+
+	'''
+	corpus = syntheticCorpus(n_transcripts, seed=seed)
+	table = corpusTable(corpus)
+	n_exons = sum([len(df) for df in corpus])
+	combinations = set()
+	for df in corpus:
+		combinations.update(zip(df['startPhase'], df['endPhase']))
+	print "Corpus: %d transcripts, %d exons, %d phase combinations" % (n_transcripts, n_exons, len(combinations))
+
+	failures = []
+	missing = expectedCombinations - set([(int(p), int(q)) for p, q in combinations])
+	if missing:
+		failures.append('the corpus lacks the phase combinations %r; use more transcripts' % sorted(missing))
+	throughput = {}
+	reference_proteins = {}
+	for name in sorted(paths.keys()):
+		reference, optimized = paths[name]
+		expected, t_ref = timed(reference, corpus, table)
+		try:
+			result, t_opt = timed(optimized, corpus, table)
+		except AssertionError as e:
+			failures.append('%s: %s' % (name, e))
+			continue
+		reference_proteins[name] = expected
+		throughput['%s_reference' % name] = n_exons / t_ref
+		throughput['%s_optimized' % name] = n_exons / t_opt
+		mismatches = [i for i in range(len(expected)) if expected[i]!=result[i]]
+		speedup = t_ref / t_opt
+		print "%s: reference %.1f exons/s, optimized %.1f exons/s, speedup %.2f, %d mismatches" % \
+			(name, n_exons / t_ref, n_exons / t_opt, speedup, len(mismatches))
+		if mismatches:
+			failures.append('%s: %d results differ from the reference, first at %d: %r != %r' % \
+				(name, len(mismatches), mismatches[0], result[mismatches[0]], expected[mismatches[0]]))
+		minimum = minimum_speedup if minimum_speedup is not None else minimumSpeedups[name]
+		if speedup < minimum:
+			failures.append('%s: the optimized path is %.2f times as fast as the reference, below the minimum of %.2f' % \
+				(name, speedup, minimum))
+
+	if golden:
+		key = '%d_%d' % (n_transcripts, seed)
+		stored = json.load(open(golden)) if os.path.isfile(golden) else {}
+		if key in stored:
+			if stored[key]!=reference_proteins:
+				failures.append('reference proteins differ from the golden output in %s' % golden)
+		else:
+			stored[key] = reference_proteins
+			json.dump(stored, open(golden, 'w'))
+			print "Wrote golden output to %s" % golden
+
+	if baseline and record:
+		json.dump(throughput, open(baseline, 'w'), indent=1, sort_keys=True)
+		print "Wrote throughput baseline to %s" % baseline
+	elif baseline:
+		expected_throughput = json.load(open(baseline))
+		for name in sorted(expected_throughput.keys()):
+			if name in throughput and throughput[name] < expected_throughput[name]*(1-tolerance):
+				failures.append('%s: %.1f exons/s is below the baseline of %.1f exons/s' % \
+					(name, throughput[name], expected_throughput[name]))
+	return failures
+
+def main(args):
+	'''
+	Runs the program with the parsed command-line arguments *args*.
+	'''
+	failures = verifyTranslation(n_transcripts=args.transcripts, seed=args.seed, baseline=args.baseline, \
+		record=args.record, tolerance=args.tolerance, golden=args.golden, minimum_speedup=args.minspeedup)
+	if failures:
+		for f in failures:
+			print "FAILED: %s" % f
+		exit(1)
+	print "Finished"
+
+if __name__=='__main__':
+	from exonTools import buildParser
+	main(buildParser('verify').parse_args())